@@ -1,10 +1,22 @@
 import openai
 from functools import wraps
+from collections import deque
+import statistics
 import asyncio
+import time
+from prompt_template import PromptTemplate
+from model_router import ModelRouter
 
 class AIService:
     def __init__(self, settings):
         self.settings = settings
+        self._latencies = {} # Tier name -> latencies of its recent successful requests, used for hedging
+        self._prompt_template = None
+        self._prompt_template_version = None
+        self.usage_stats = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+        self._llm_semaphore = None # Limits concurrent LLM requests across text and image files, see _get_llm_semaphore
+        self._llm_semaphore_loop = None
+        self.model_router = ModelRouter(settings)
 
     # Internal method starts with _
     def _log(self, title, message):
@@ -12,9 +24,9 @@ class AIService:
         print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
 
     # Internal method starts with _
-    def _get_client(self):
-        """Create and return an OpenAI client with current settings"""
-        llm_provider = self.settings.get('llm_provider')
+    def _get_client(self, llm_provider=None):
+        """Create and return an OpenAI client with current settings, for the given or the configured provider"""
+        llm_provider = llm_provider or self.settings.get('llm_provider')
         self._log(f"AIService get_client LLM Provider", llm_provider)
         
         return openai.AsyncOpenAI(
@@ -47,11 +59,81 @@ class AIService:
             except openai.APIError as e:
                 self._log(f"AIService {func.__name__} Error", e)
                 return False, "AI Service Error: Unexpected error"
+            except asyncio.TimeoutError as e:
+                self._log(f"AIService {func.__name__} Error", "Request deadline exceeded")
+                return False, "AI Service Error: API timeout"
             except Exception as e:
                 self._log(f"AIService {func.__name__} Error", e)
                 return False, "AI Service Error: Unexpected error"
         return wrapper
 
+    # Internal method starts with _
+    def _get_hedge_delay(self, tier_name):
+        """Return the tier's observed p95 latency to wait before hedging, or None if hedging does not apply"""
+        if not self.settings.get('hedge_requests'):
+            return None
+
+        # Tiers differ widely in latency (small model vs long context), each is hedged on its own p95
+        latencies = self._latencies.get(tier_name)
+
+        # Not enough samples yet for a meaningful p95
+        if latencies is None or len(latencies) < 20:
+            return None
+
+        return statistics.quantiles(latencies, n=20)[-1]
+
+    # Internal method starts with _
+    def _get_llm_semaphore(self):
+        """Return the semaphore shared by all LLM requests of the running event loop"""
+        # Each batch runs its own event loop and asyncio primitives are bound to one loop
+        loop = asyncio.get_running_loop()
+        if self._llm_semaphore is None or self._llm_semaphore_loop is not loop:
+            self._llm_semaphore = asyncio.Semaphore(self.settings.get('llm_max_concurrency'))
+            self._llm_semaphore_loop = loop
+        return self._llm_semaphore
+
+    # Internal method starts with _
+    async def _create_completion(self, client, tier_name, **request):
+        """Send a chat completion request with a per-request deadline and optional hedging on the tier's latencies"""
+        request_timeout = self.settings.get('request_timeout')
+        hedge_delay = self._get_hedge_delay(tier_name)
+        llm_semaphore = self._get_llm_semaphore()
+        latencies = self._latencies.setdefault(tier_name, deque(maxlen=200))
+
+        async def timed_request():
+            async with llm_semaphore:
+                start_time = time.perf_counter()
+                response = await asyncio.wait_for(client.chat.completions.create(**request), timeout=request_timeout)
+                latencies.append(time.perf_counter() - start_time)
+                return response
+
+        # Send a single request if hedging is disabled or not applicable yet
+        if hedge_delay is None:
+            return await timed_request()
+
+        primary = asyncio.create_task(timed_request())
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if done:
+                return primary.result()
+
+            # Primary request is slower than p95, send a duplicate and take whichever answers first
+            self._log("AIService _create_completion Hedging", f"No response after {hedge_delay:.2f}s, sending duplicate request")
+            pending.add(asyncio.create_task(timed_request()))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+
+            # Both requests failed, raise the error of the primary request
+            return primary.result()
+        finally:
+            # Cancel the slower request (also when the caller's per-file deadline cancels us)
+            for task in pending:
+                task.cancel()
+
     @_handle_openai_errors
     async def verify_credentials(self):
         """Verify if the API credentials are valid by making a minimal API call"""
@@ -79,59 +161,131 @@ class AIService:
             self._log("AIService verify_credentials Error", error_msg)
             return False, f"AI Service Error: {error_msg}"
 
+    async def warm_up(self):
+        """Make a cheap credential check, so the first file does not pay for the client's lazily imported modules
+
+        Connections are not reused: every request opens its own client, in the event loop of its batch.
+        """
+        llm_provider = self.settings.get('llm_provider')
+        if not self.settings.get(f'{llm_provider}_api_key'):
+            return False, "API key not set"
+
+        # Same minimal request as verifying credentials, it also reports a bad key before the first file is dropped
+        return await self.verify_credentials()
+
+    # Internal method starts with _
+    def _get_prompt_template(self):
+        """Return the prompt template, compiled once per settings version"""
+        settings_version = self.settings.version()
+
+        if self._prompt_template is None or self._prompt_template_version != settings_version:
+            self._prompt_template = PromptTemplate(
+                self.settings.get('naming_language'),
+                self.settings.get('naming_convention'),
+                self.settings.get('custom_instruction')
+            )
+            self._prompt_template_version = settings_version
+
+        return self._prompt_template
+
+    # Internal method starts with _
+    def _record_usage(self, response):
+        """Accumulate token usage, including prompt tokens served from the provider's prompt cache, returns (prompt, completion) tokens"""
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return 0, 0
+
+        # Not every provider reports cached tokens
+        prompt_tokens_details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(prompt_tokens_details, 'cached_tokens', None) or 0
+
+        self.usage_stats['requests'] += 1
+        self.usage_stats['prompt_tokens'] += usage.prompt_tokens or 0
+        self.usage_stats['cached_tokens'] += cached_tokens
+        self.usage_stats['completion_tokens'] += usage.completion_tokens or 0
+
+        self._log("AIService Token Usage", f"Prompt tokens: {usage.prompt_tokens} (cached: {cached_tokens}), completion tokens: {usage.completion_tokens}\nTotal: {self.usage_stats}")
+        return usage.prompt_tokens or 0, usage.completion_tokens or 0
+
+    def build_request(self, file_content, tier=None):
+        """Build the chat completion request for a file, shared by interactive and batch mode"""
+        tier = tier or self.model_router.default_tier()
+
+        return {
+            "model": tier['model'],
+            "messages": self._get_prompt_template().build_messages(file_content),
+            "temperature": 0.7,
+            "max_tokens": 50
+        }
+
+    def build_image_request(self, image_url, tier=None):
+        """Build the vision request naming an image directly, shared by interactive and batch mode"""
+        tier = tier or self.model_router.default_tier()
+
+        return {
+            "model": tier['model'],
+            "messages": self._get_prompt_template().build_image_messages(image_url),
+            "temperature": 0.7,
+            "max_tokens": 50
+        }
+
+    # Internal method starts with _
+    async def _request_suggestion(self, tier, request):
+        """Send a naming request to the tier's provider, recording the tier's metrics, returns the suggestion"""
+        start_time = time.perf_counter()
+        try:
+            async with self._get_client(tier['provider']) as client:
+                response = await self._create_completion(client, tier['name'], **request)
+        except Exception:
+            self.model_router.record(tier, False, time.perf_counter() - start_time)
+            raise
+
+        prompt_tokens, completion_tokens = self._record_usage(response)
+        self.model_router.record(tier, True, time.perf_counter() - start_time, prompt_tokens, completion_tokens)
+        return response.choices[0].message.content.strip()
+
     @_handle_openai_errors
     async def get_suggestion(self, file_content, file_extension):
-        """Get AI suggestion for file naming based on content"""
-        llm_provider = self.settings.get('llm_provider')
-        naming_language = self.settings.get('naming_language')
-        naming_convention = self.settings.get('naming_convention')
-        custom_instruction = self.settings.get('custom_instruction')
-
-        if naming_language == 'en':
-            if naming_convention == 'with-spaces':
-                naming_convention_prompt = f"Capitalize the first letter of each word and separate words with spaces, e.g. This Is New File Name"
-            elif naming_convention == 'pascal-case':
-                naming_convention_prompt = "PascalCase: Capitalize the first letter of each word without spaces in between, e.g. ThisIsNewFileName"
-            elif naming_convention == 'camel-case':
-                naming_convention_prompt = "camelCase: Except for the first word being in lowercase, the first letter of each subsequent word is capitalized, with no spaces in between., e.g. thisIsNewFileName"
-            elif naming_convention == 'snake-case':
-                naming_convention_prompt = "snake_case: Lowercase each word and separate words with underscores, e.g. this_is_new_file_name"
-            elif naming_convention == 'kebab-case':
-                naming_convention_prompt = "kebab-case: Lowercase each word and separate words with hyphens, e.g. this-is-new-file-name"
-            elif naming_convention == 'not-applicable':
-                naming_convention_prompt = "This is not applicable, please ignore this requirement temporarily."
-
-        else:
-            naming_convention_prompt = "This is not applicable, please ignore this requirement temporarily."
-
-        system_prompt = f"""
-        You are an assistant that provides file naming suggestions based on the file content.
-        When asked to rename a file, you always adhere to the following rules:
-        1. ONLY output the suggested new file name without any additional text.
-        2. Do not add any file extension to the new file name
-        3. Since the content of the parsed files lacks a hierarchical structure, please make sure to come up with a file name that takes all the file content into account.
-        4. Avoid using any invalid characters in new file name.
-        5. Use {naming_language} for naming the file.
-        6. Follow the naming convention: {naming_convention_prompt}
-        ---
-        Custom Instruction: {custom_instruction}
-        """
+        """Get AI suggestion for file naming based on content, from the model tier the routing rules choose"""
+        tier = self.model_router.route(file_extension, len(file_content), vision=False)
+        suggestion = await self._request_suggestion(tier, self.build_request(file_content, tier))
+        self._log(f"AIService get_suggestion Result", f"{suggestion} ({tier['name']})")
+        return True, suggestion
 
-        user_prompt = f"Please suggest a new file name (without extension) based on the following file content: {file_content}"
+    @_handle_openai_errors
+    async def get_image_suggestion(self, image_url, file_extension=None):
+        """Get AI suggestion for an image's file name in a single vision request, without captioning it first"""
+        # The size of an image is the size of its encoded data URL
+        tier = self.model_router.route(file_extension, len(image_url), vision=True)
+        suggestion = await self._request_suggestion(tier, self.build_image_request(image_url, tier))
+        self._log(f"AIService get_image_suggestion Result", f"{suggestion} ({tier['name']})")
+        return True, suggestion
 
+    @_handle_openai_errors
+    async def submit_batch(self, input_path):
+        """Upload a JSONL file of chat completion requests and create a batch job, returns the batch id"""
         async with self._get_client() as client:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-            
-            response = await client.chat.completions.create(
-                model=self.settings.get(f'{llm_provider}_model'),
-                messages=messages,
-                temperature=0.7,
-                max_tokens=50
+            with open(input_path, 'rb') as f:
+                input_file = await client.files.create(file=f, purpose='batch')
+
+            batch = await client.batches.create(
+                input_file_id=input_file.id,
+                endpoint='/v1/chat/completions',
+                completion_window='24h'
             )
+            self._log("AIService submit_batch Result", f"Batch {batch.id} created from {input_path}")
+            return True, batch.id
+
+    @_handle_openai_errors
+    async def retrieve_batch(self, batch_id):
+        """Retrieve the current state of a batch job"""
+        async with self._get_client() as client:
+            batch = await client.batches.retrieve(batch_id)
+            return True, batch
 
-            suggestion = response.choices[0].message.content.strip()
-            self._log(f"AIService get_suggestion Result", suggestion)
-            return True, suggestion
\ No newline at end of file
+    @_handle_openai_errors
+    async def download_file(self, file_id):
+        """Download the content of a file, e.g. the output of a batch job"""
+        async with self._get_client() as client:
+            response = await client.files.content(file_id)
+            return True, response.text
\ No newline at end of file
@@ -0,0 +1,254 @@
+from collections import deque
+import asyncio
+import json
+import os
+
+class BatchJob:
+    """Offline batch mode: writes all prompts to a JSONL file, submits it to the provider's Batch API, polls and applies the renames"""
+
+    # Batch statuses after which polling stops
+    FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+    def __init__(self, settings, ai_service, file_processor, state_path):
+        self.settings = settings
+        self.ai_service = ai_service
+        self.file_processor = file_processor
+        self.state_path = state_path
+        self.input_path = os.path.splitext(state_path)[0] + '.jsonl'
+
+        # State is saved after every step, so an interrupted job resumes where it stopped
+        self.state = self._load_state()
+
+    # Internal method starts with _
+    def _log(self, title, message):
+        """Utility method for debugging purposes"""
+        print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
+
+    # Internal method starts with _
+    def _load_state(self):
+        """Load the job state from the state file, or create a new one"""
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        return {"batch_id": None, "status": "new", "output_file_id": None, "error_file_id": None, "paths": [], "files": {}}
+
+    # Internal method starts with _
+    def _save_state(self):
+        """Save the job state atomically, so a crash never leaves a half-written state file"""
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=4, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def is_new(self):
+        """Whether the state file holds no job yet, so new files can be submitted with it"""
+        return self.state['status'] == 'new'
+
+    async def run(self, file_paths):
+        """Run the job to completion: submit (unless resuming), wait for the batch and apply the renames"""
+        # An existing job (even a completed one) is only resumed, never mixed with new files
+        if file_paths and not self.is_new():
+            return False, f"{self.state_path} belongs to an existing job ({self.state['status']}), run without paths to resume it or use another state file"
+
+        if self.state['status'] == 'new':
+            # Never rename the job's own state and input files
+            own_files = (os.path.abspath(self.state_path), os.path.abspath(self.input_path))
+            file_paths = [file_path for file_path in file_paths if os.path.abspath(file_path) not in own_files]
+
+            if not file_paths:
+                return False, "No files to process"
+
+            self.state.update(status='preparing', paths=[os.path.abspath(file_path) for file_path in file_paths])
+            self._save_state()
+
+        if self.state['status'] == 'preparing':
+            success, message = await self.submit()
+            if not success:
+                return False, message
+
+        if self.state['status'] not in self.FINAL_STATUSES:
+            success, message = await self.wait()
+            if not success:
+                return False, message
+
+        return await self.apply()
+
+    async def submit(self):
+        """Extract the job's files, write their requests to a JSONL file and submit it as one batch
+
+        Prepared files are saved to the state as they go, so an interrupted preparation resumes with the files left.
+        """
+        files = self.state['files']
+        pending_files = deque((index, file_path) for index, file_path in enumerate(self.state['paths']) if str(index) not in files)
+        prepared_count = 0
+
+        # Keep only the requests of files saved to the state, a request written after the last save is prepared again
+        self._trim_input()
+
+        async def prepare_files(f):
+            nonlocal prepared_count
+
+            # Each request is written as soon as it is prepared, so contents are not held for the whole job
+            while pending_files:
+                index, file_path = pending_files.popleft()
+                custom_id = str(index)
+                entry = {"file_path": file_path, "suggestion": None, "status": "pending", "message": None}
+
+                kind, value = await self.file_processor.prepare_request(file_path)
+                if kind == 'request':
+                    f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": value}, ensure_ascii=False) + "\n")
+                elif kind == 'suggestion':
+                    entry.update(suggestion=value, status="named")
+                elif kind == 'skipped':
+                    entry.update(status="renamed", message="Already renamed")
+                else:
+                    entry.update(status="error", message=value)
+
+                files[custom_id] = entry
+
+                # Save progress regularly, requests are flushed first so every saved pending file has its request on disk
+                prepared_count += 1
+                if prepared_count % 100 == 0:
+                    f.flush()
+                    self._save_state()
+
+        # Bound the number of files being extracted at once
+        preparer_count = max(1, self.settings.get('extraction_workers')) * 2
+
+        self.file_processor.begin_batch()
+        try:
+            with open(self.input_path, 'a', encoding='utf-8') as f:
+                await asyncio.gather(*(prepare_files(f) for _ in range(preparer_count)))
+        finally:
+            self.file_processor.end_batch()
+            self._save_state()
+
+        # Every file was named from metadata or failed, nothing to submit
+        request_count = sum(1 for entry in files.values() if entry['status'] == 'pending')
+        if request_count == 0:
+            self.state['status'] = 'completed'
+            self._save_state()
+            return True, "No requests to submit"
+
+        success, batch_id = await self.ai_service.submit_batch(self.input_path)
+        if not success:
+            return False, batch_id
+
+        self.state.update(batch_id=batch_id, status='submitted')
+        self._save_state()
+        self._log("BatchJob submit Result", f"Submitted {request_count} request(s) as batch {batch_id}")
+        return True, batch_id
+
+    # Internal method starts with _
+    def _trim_input(self):
+        """Drop the requests of files not saved to the state from the input file of an interrupted preparation"""
+        files = self.state['files']
+        temp_path = self.input_path + '.tmp'
+
+        with open(temp_path, 'w', encoding='utf-8') as output:
+            try:
+                with open(self.input_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        # The last line may have been cut off by the interruption
+                        try:
+                            custom_id = json.loads(line)['custom_id']
+                        except (ValueError, KeyError):
+                            continue
+                        if files.get(custom_id, {}).get('status') == 'pending':
+                            output.write(line)
+            except FileNotFoundError:
+                pass
+
+        os.replace(temp_path, self.input_path)
+
+    async def wait(self):
+        """Poll the batch until it reaches a final status"""
+        poll_interval = self.settings.get('batch_poll_interval')
+
+        while True:
+            success, batch = await self.ai_service.retrieve_batch(self.state['batch_id'])
+            if not success:
+                return False, batch
+
+            self.state.update(status=batch.status, output_file_id=batch.output_file_id, error_file_id=batch.error_file_id)
+            self._save_state()
+            self._log("BatchJob wait Status", f"Batch {self.state['batch_id']}: {batch.status}")
+
+            if batch.status in self.FINAL_STATUSES:
+                return True, batch.status
+
+            await asyncio.sleep(poll_interval)
+
+    async def apply(self):
+        """Collect the suggestions from the batch output and rename the files"""
+        files = self.state['files']
+
+        # Results of requests (successful and failed) are in the output and error files
+        for file_id in (self.state['output_file_id'], self.state['error_file_id']):
+            if not file_id:
+                continue
+
+            success, content = await self.ai_service.download_file(file_id)
+            if not success:
+                return False, content
+
+            for line in content.splitlines():
+                if line.strip():
+                    self._collect_result(json.loads(line))
+
+        # Rename the files, skipping the ones already renamed by an earlier (interrupted) run
+        for index, entry in enumerate(files.values()):
+            # Save progress regularly, so an interrupted run does not rename files twice
+            if index % 100 == 0:
+                self._save_state()
+
+            if entry['status'] != 'named':
+                continue
+
+            if not os.path.exists(entry['file_path']):
+                entry.update(status='error', message=f"File not found: {entry['file_path']}")
+                continue
+
+            success, message = self.file_processor.apply_suggestion(entry['file_path'], entry['suggestion'])
+            entry.update(status='renamed' if success else 'error', message=message)
+            if success:
+                self.file_processor.mark_renamed(entry['file_path'], message)
+
+        self._save_state()
+        self.file_processor.rename_marker.flush()
+
+        renamed_count = sum(1 for entry in files.values() if entry['status'] == 'renamed')
+        message = f"Renamed {renamed_count}/{len(files)} file(s)"
+
+        # A failed, expired or cancelled batch has no (or partial) output, say why files were not renamed
+        if self.state['status'] != 'completed':
+            message += f", batch {self.state['batch_id']} {self.state['status']}"
+
+        self._log("BatchJob apply Result", message)
+        return renamed_count == len(files), message
+
+    # Internal method starts with _
+    def _collect_result(self, result):
+        """Store the suggestion (or error) of one batch output line in the job state"""
+        entry = self.state['files'].get(result.get('custom_id'))
+        if entry is None or entry['status'] != 'pending':
+            return
+
+        response = result.get('response') or {}
+        if result.get('error') or response.get('status_code') != 200:
+            entry.update(status='error', message=f"AI Service Error: {result.get('error') or response.get('body')}")
+            return
+
+        # A 200 response may still come without choices or content, e.g. when the provider filtered it
+        try:
+            suggestion = response['body']['choices'][0]['message']['content'].strip()
+        except (KeyError, IndexError, TypeError, AttributeError):
+            entry.update(status='error', message=f"AI Service Error: Unexpected response: {response.get('body')}")
+            return
+
+        if not suggestion:
+            entry.update(status='error', message="AI Service Error: Empty suggestion")
+            return
+
+        entry.update(suggestion=suggestion, status='named')
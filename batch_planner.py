@@ -0,0 +1,158 @@
+import os
+from token_counter import TokenCounter
+
+class BatchPlanner:
+    """Planning pass before a batch: estimates tokens and cost per file and orders the work to minimize makespan"""
+
+    # Approximate extracted characters per byte of file, for formats that cannot be sampled cheaply
+    EXTRACTED_CHARS_PER_BYTE = {
+        '.pdf': 0.05,
+        '.docx': 0.2,
+        '.doc': 0.3,
+        '.pptx': 0.02,
+        '.ppt': 0.05,
+        '.xlsx': 0.5,
+        '.xls': 0.3,
+    }
+
+    # Relative extraction cost per byte, text formats are read through the bounded fast path at no notable cost
+    EXTRACTION_COST_PER_BYTE = {
+        '.pdf': 1.0,
+        '.docx': 0.5,
+        '.doc': 1.0,
+        '.pptx': 0.5,
+        '.ppt': 1.0,
+        '.xlsx': 2.0,
+        '.xls': 2.0,
+        '.jpg': 0.2,
+        '.jpeg': 0.2,
+        '.png': 0.2,
+    }
+
+    # Vision prompt tokens of an image plus its caption in the naming prompt
+    IMAGE_PROMPT_TOKENS = 1100
+
+    # Vision prompt tokens of a downscaled image named in a single request
+    VISION_PROMPT_TOKENS = 800
+
+    # Typical length of a suggested file name
+    COMPLETION_TOKENS = 20
+
+    def __init__(self, settings, file_processor, ai_service):
+        self.settings = settings
+        self.file_processor = file_processor
+        self.ai_service = ai_service
+        self.token_counter = TokenCounter()
+
+    def plan(self, file_paths, routed=True):
+        """Estimate every file of a batch, returns (estimates, summary)
+
+        Each file is priced at the model tier the routing rules choose for it. Without routed (batch mode sends every
+        request to the provider's model), all files are priced at the default tier.
+        """
+        # The prompt without file content is the same for every file
+        base_request = self.ai_service.build_request("")
+        base_prompt_tokens = sum(self.token_counter.count(message['content']) for message in base_request['messages'])
+
+        estimates = [self._estimate_file(file_path, base_prompt_tokens, routed) for file_path in file_paths]
+
+        prompt_tokens = sum(estimate['prompt_tokens'] for estimate in estimates)
+        completion_tokens = sum(estimate['completion_tokens'] for estimate in estimates)
+        cost = sum(estimate['cost'] for estimate in estimates)
+
+        budget_cap = self.settings.get('budget_cap_usd')
+        summary = {
+            'file_count': len(file_paths),
+            'llm_file_count': sum(1 for estimate in estimates if estimate['prompt_tokens']),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'cost': cost,
+            'budget_cap': budget_cap,
+            'over_budget': bool(budget_cap) and cost > budget_cap
+        }
+
+        print(f"\n\n\n-----------------\n\n\n# BatchPlanner plan Summary:\n\n{self.describe(summary)}")
+        return estimates, summary
+
+    def describe(self, summary):
+        """Describe a plan summary in one line"""
+        description = (
+            f"Estimated {summary['prompt_tokens'] + summary['completion_tokens']:,} tokens "
+            f"for {summary['llm_file_count']}/{summary['file_count']} file(s), about ${summary['cost']:.4f}"
+        )
+        if summary['budget_cap']:
+            description += f" (budget ${summary['budget_cap']:.2f})"
+        return description
+
+    def order(self, estimates):
+        """Order files: largest extraction jobs first, interleaved with the smallest LLM-only jobs"""
+        # Heavy extractions start first so they do not end up as the tail of the batch
+        extraction_jobs = sorted((estimate for estimate in estimates if estimate['extraction_cost']), key=lambda estimate: -estimate['extraction_cost'])
+
+        # Shortest LLM jobs first, they fill the time while extraction workers are busy
+        llm_jobs = sorted((estimate for estimate in estimates if not estimate['extraction_cost']), key=lambda estimate: estimate['prompt_tokens'])
+
+        ordered = []
+        for index in range(max(len(extraction_jobs), len(llm_jobs))):
+            if index < len(extraction_jobs):
+                ordered.append(extraction_jobs[index]['file_path'])
+            if index < len(llm_jobs):
+                ordered.append(llm_jobs[index]['file_path'])
+        return ordered
+
+    # Internal method starts with _
+    def _estimate_file(self, file_path, base_prompt_tokens, routed=True):
+        """Estimate the extraction cost, tokens and LLM cost of a single file from its size and a bounded sample"""
+        estimate = {'file_path': file_path, 'extraction_cost': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0}
+        file_extension = os.path.splitext(file_path)[1].lower()
+
+        # Missing or unsupported files are reported when processed, they cost nothing
+        try:
+            file_size = os.path.getsize(file_path)
+        except OSError:
+            return estimate
+        if file_extension not in self.file_processor.supported_extensions:
+            return estimate
+
+        # Files renamed by an earlier run are skipped
+        if self.settings.get('skip_processed_files') and self.file_processor.rename_marker.is_processed(file_path):
+            return estimate
+
+        # Files named from metadata skip extraction and the LLM
+        if self.file_processor.suggest_from_metadata(file_path):
+            return estimate
+
+        max_content_chars = self.settings.get('max_content_chars')
+        vision = self.file_processor.uses_vision(file_path)
+
+        if file_extension in self.file_processor.text_reader.supported_extensions:
+            # Text formats are read exactly as they will be sent, bounded, normalized and capped
+            success, file_content = self.file_processor.extract_content(file_path)
+            content_chars = len(file_content) if success else 0
+            content_tokens = self.token_counter.count(file_content) if success else 0
+        elif vision:
+            # Routing rules see the size of the encoded image, bounded by the vision size limit
+            max_side = self.settings.get('vision_max_image_side')
+            content_chars = min(file_size, max_side * max_side * 3) * 4 // 3
+            content_tokens = self.VISION_PROMPT_TOKENS
+        elif file_extension in self.file_processor.image_extensions:
+            content_tokens = self.IMAGE_PROMPT_TOKENS
+            content_chars = content_tokens * TokenCounter.CHARS_PER_TOKEN
+        else:
+            content_chars = int(min(file_size * self.EXTRACTED_CHARS_PER_BYTE.get(file_extension, 0.1), max_content_chars))
+            content_tokens = content_chars // TokenCounter.CHARS_PER_TOKEN
+
+        # Price the file at the tier it will be sent to, rules may name other models and prices
+        model_router = self.ai_service.model_router
+        tier = model_router.route(file_extension, content_chars, vision) if routed else model_router.default_tier()
+        prompt_price, completion_price = model_router.prices(tier)
+
+        prompt_tokens = base_prompt_tokens + content_tokens
+        estimate.update(
+            # Images are only downscaled, there is no extraction job to schedule
+            extraction_cost=0 if vision else file_size * self.EXTRACTION_COST_PER_BYTE.get(file_extension, 0),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=self.COMPLETION_TOKENS,
+            cost=(prompt_tokens * prompt_price + self.COMPLETION_TOKENS * completion_price) / 1_000_000
+        )
+        return estimate
@@ -0,0 +1,122 @@
+from collections import Counter
+import re
+from token_counter import TokenCounter
+
+class ContentNormalizer:
+    """Minifies extracted content before it is sent as prompt tokens, without losing what the name is based on"""
+
+    # Markdown images with inline data, and bare data URIs
+    DATA_URI_IMAGE_PATTERN = re.compile(r'!\[([^\]]*)\]\(data:[^)]*\)')
+    DATA_URI_PATTERN = re.compile(r'data:[\w.+-]+/[\w.+-]+(?:;[\w=.+-]+)*,[A-Za-z0-9+/=%_-]{16,}')
+
+    # HTML comments, e.g. the slide number markers of presentations
+    COMMENT_PATTERN = re.compile(r'<!--.*?-->', re.DOTALL)
+
+    TABLE_SEPARATOR_PATTERN = re.compile(r'^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$')
+
+    # Placeholders of empty spreadsheet cells and unnamed columns
+    EMPTY_CELL_PATTERN = re.compile(r'^(NaN|nan|None|Unnamed: \d+)?$')
+
+    HORIZONTAL_WHITESPACE_PATTERN = re.compile(r'[ \t 　]+')
+    DIGITS_PATTERN = re.compile(r'\d+')
+
+    # Lines checked for repeated headers and footers at the top and bottom of each page
+    PAGE_EDGE_LINES = 2
+    MIN_PAGES = 3
+
+    # Normalized input is capped at this multiple of max_content_chars, minifying rarely shrinks content more than that
+    INPUT_CHARS_FACTOR = 4
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.token_counter = TokenCounter()
+
+    # Internal method starts with _
+    def _log(self, title, message):
+        """Utility method for debugging purposes"""
+        print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
+
+    def normalize(self, text, file_path=None):
+        """Return the minified content, logging the tokens saved (pass a bounded prefix, see INPUT_CHARS_FACTOR)"""
+        normalized = self.DATA_URI_IMAGE_PATTERN.sub(lambda match: f"[image: {match.group(1)}]" if match.group(1).strip() else "", text)
+        normalized = self.DATA_URI_PATTERN.sub("", normalized)
+        normalized = self.COMMENT_PATTERN.sub("", normalized)
+
+        # PDF text has a form feed between pages
+        pages = normalized.split('\f')
+        if len(pages) >= self.MIN_PAGES:
+            pages = self._drop_repeated_page_edges(pages)
+
+        lines = []
+        for page in pages:
+            for line in page.splitlines():
+                line = self.HORIZONTAL_WHITESPACE_PATTERN.sub(' ', line).strip()
+                if line.startswith('|'):
+                    line = self._compact_table_row(line)
+                if line:
+                    lines.append(line)
+        normalized = "\n".join(lines)
+
+        if not normalized:
+            return text
+
+        original_tokens = self.token_counter.count(text)
+        normalized_tokens = self.token_counter.count(normalized)
+        self._log(
+            "ContentNormalizer normalize Result",
+            f"{file_path or 'Content'}: {original_tokens:,} -> {normalized_tokens:,} tokens, saved {original_tokens - normalized_tokens:,}"
+        )
+        return normalized
+
+    # Internal method starts with _
+    def _compact_table_row(self, line):
+        """Collapse a markdown table row into compact delimited cells, separator and empty rows are dropped"""
+        if self.TABLE_SEPARATOR_PATTERN.match(line):
+            return ""
+
+        cells = [cell.strip() for cell in line.strip('|').split('|')]
+        cells = ["" if self.EMPTY_CELL_PATTERN.match(cell) else cell for cell in cells]
+
+        # Trailing empty cells carry no information
+        while cells and not cells[-1]:
+            cells.pop()
+
+        return "; ".join(cells)
+
+    # Internal method starts with _
+    def _drop_repeated_page_edges(self, pages):
+        """Drop header and footer lines repeated on most pages, keeping their first occurrence"""
+        def page_edges(page):
+            lines = [line.strip() for line in page.splitlines() if line.strip()]
+
+            # Short pages keep at least one line of body text
+            edge_lines = min(self.PAGE_EDGE_LINES, (len(lines) - 1) // 2)
+            if edge_lines <= 0:
+                return []
+            return lines[:edge_lines] + lines[-edge_lines:]
+
+        # Page numbers differ between pages, compare lines with digits masked
+        counts = Counter()
+        for page in pages:
+            counts.update({self.DIGITS_PATTERN.sub('#', line) for line in page_edges(page)})
+
+        threshold = max(self.MIN_PAGES, len(pages) // 2)
+        repeated = {line for line, count in counts.items() if count >= threshold}
+        if not repeated:
+            return pages
+
+        seen = set()
+        result = []
+        for page in pages:
+            edges = set(page_edges(page))
+            kept_lines = []
+            for line in page.splitlines():
+                stripped = line.strip()
+                key = self.DIGITS_PATTERN.sub('#', stripped)
+                if stripped in edges and key in repeated:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                kept_lines.append(line)
+            result.append("\n".join(kept_lines))
+        return result
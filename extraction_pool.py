@@ -0,0 +1,146 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from memory_governor import MemoryGovernor
+import threading
+import asyncio
+
+# File processor and profiler of this extraction worker process, created by the pool initializer
+_worker_file_processor = None
+_worker_profiler = None
+
+def _init_worker():
+    """Create the file processor and profiler used by an extraction worker process"""
+    global _worker_file_processor, _worker_profiler
+
+    # Imported here, file_processor imports this module
+    from settings import Settings
+    from file_processor import FileProcessor
+    from profiler import Profiler
+
+    settings = Settings()
+    _worker_file_processor = FileProcessor(settings, None)
+    _worker_profiler = Profiler(settings)
+
+def _extract_in_worker(file_path):
+    """Extract file content in a worker process, also returning the worker's RSS for recycling"""
+    if _worker_profiler.is_enabled():
+        success, file_content = _worker_profiler.profile_worker_call(_worker_file_processor.extract_content, file_path)
+    else:
+        success, file_content = _worker_file_processor.extract_content(file_path)
+    return success, file_content, MemoryGovernor.current_rss()
+
+def _warm_up_worker():
+    """Load the converters of an extraction worker process"""
+    _worker_file_processor.load_converters()
+
+class ExtractionPool:
+    """Pool of extraction worker processes, recycled once a worker grows past the RSS limit"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._executor = None # Started lazily on first use
+        self._executor_lock = threading.Lock() # Warm-up and processing may start the pool from different threads
+
+    # Internal method starts with _
+    def _log(self, title, message):
+        """Utility method for debugging purposes"""
+        print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
+
+    # Internal method starts with _
+    def _get_executor(self):
+        """Return the current executor, starting new worker processes if needed"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.settings.get('extraction_workers'),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    # Internal method starts with _
+    def _recycle(self, executor):
+        """Replace the worker processes, extractions already submitted still finish in the old ones"""
+        with self._executor_lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False)
+
+    # Internal method starts with _
+    def _terminate(self, executor):
+        """Kill the worker processes, e.g. one is stuck on a file, extractions still running in them fail"""
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+
+        # ProcessPoolExecutor has no public way to stop a running task, only its processes can be killed
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def extract(self, file_path, memory_governor=None, timeout=None):
+        """Extract file content in a worker process, returns (success, content) like FileProcessor.extract_content
+
+        Raises asyncio.TimeoutError after timeout seconds, the workers are then killed so the stuck file cannot keep
+        holding one of them.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        executor = self._get_executor()
+        try:
+            success, file_content, worker_rss = await self._run(executor, file_path, timeout)
+        except BrokenProcessPool as e:
+            # A worker died, most likely killed by the OS for running out of memory
+            self._log("ExtractionPool extract Error", e)
+            self._recycle(executor)
+
+            # A crash fails every extraction running in the pool, not only the file that caused it. Retry once in a
+            # worker of its own, so only the file that crashes it again fails
+            executor = ProcessPoolExecutor(max_workers=1, initializer=_init_worker)
+            try:
+                success, file_content, worker_rss = await self._run(executor, file_path, None if deadline is None else deadline - loop.time())
+            except BrokenProcessPool:
+                return False, "Error extracting file content: extraction worker crashed"
+            finally:
+                executor.shutdown(wait=False)
+
+        if memory_governor is not None:
+            memory_governor.record_rss(worker_rss, worker=True)
+
+        # Python rarely returns freed memory to the OS, so restart workers that grew too large
+        worker_rss_limit = self.settings.get('worker_rss_limit_mb') * 1024 * 1024
+        if worker_rss and worker_rss > worker_rss_limit:
+            self._log("ExtractionPool extract Recycling", f"Worker RSS {worker_rss / 1024 / 1024:.1f} MB exceeds limit, restarting workers")
+            self._recycle(executor)
+
+        return success, file_content
+
+    # Internal method starts with _
+    async def _run(self, executor, file_path, timeout):
+        """Run the extraction in the executor, killing its workers if the file is still running after timeout seconds"""
+        try:
+            return await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(executor, _extract_in_worker, file_path),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            self._log("ExtractionPool extract Timeout", f"{file_path}: still running after {timeout} seconds, restarting workers")
+            self._terminate(executor)
+            raise
+
+    async def warm_up(self):
+        """Start all worker processes and load their converters"""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+
+        # One task per worker, the pool starts a new process for each task while none is idle
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, _warm_up_worker) for _ in range(self.settings.get('extraction_workers'))
+        ))
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,41 +1,77 @@
 import markitdown
 from openai import OpenAI
+import contextlib
+import asyncio
+import time
 import os
 import re
+from text_reader import TextReader
+from metadata_namer import MetadataNamer
+from near_duplicates import NearDuplicateIndex
+from memory_governor import MemoryGovernor
+from extraction_pool import ExtractionPool
+from image_encoder import ImageEncoder
+from rename_marker import RenameMarker
+from content_normalizer import ContentNormalizer
+from profiler import Profiler
 
 class FileProcessor:
+    # Supported file types
+    supported_extensions = ('.pdf', '.docx', '.doc', '.pptx', '.ppt', '.xlsx', '.xls', '.jpg', '.jpeg', '.png', '.txt', '.md', '.json', '.csv', '.xml', '.html')
+
+    # Images named by the vision model directly, see uses_vision
+    image_extensions = ('.jpg', '.jpeg', '.png')
+
     def __init__(self, settings, ai_service):
         self.settings = settings
         self.ai_service = ai_service
-        self.markitdown_excluded_extensions = [".md"]
+        self.text_reader = TextReader(settings)
+        self.metadata_namer = MetadataNamer(settings)
+        self.extraction_pool = ExtractionPool(settings)
+        self.image_encoder = ImageEncoder(settings)
+        self.rename_marker = RenameMarker(settings)
+        self.content_normalizer = ContentNormalizer(settings)
+        self.profiler = Profiler(settings)
+        self.near_duplicates = None # Near-duplicate index of the current batch, see begin_batch
+        self.memory_governor = None # In-flight content budget of the current batch, see begin_batch
+        self.recently_renamed = {} # New file path -> time of the rename
+        self._markitdown = None # Cached MarkItDown converter, see _get_markitdown
+        self._markitdown_key = None
+        self._extraction_semaphore = None # Bounds extractions in flight to the extraction workers, see _extraction_slot
+        self._extraction_semaphore_loop = None
     
     def extract_content(self, file_path):
-        """Extract the content of the file using MarkItDown"""
+        """Extract the content of the file, minified and capped at max_content_chars characters"""
+        success, file_content = self._extract_content(file_path)
+        max_content_chars = self.settings.get('max_content_chars')
+
+        # Drop table markup, inline images, repeated page headers and whitespace before they become prompt tokens
+        if success and self.settings.get('normalize_content'):
+            # Only a bounded prefix is normalized, enough to fill max_content_chars once minified, never the whole file
+            file_content = file_content[:max_content_chars * self.content_normalizer.INPUT_CHARS_FACTOR]
+            file_content = self.content_normalizer.normalize(file_content, file_path)
+
+        # Cap the content, the prompt never needs more and huge spreadsheets would otherwise be kept whole
+        if success and len(file_content) > max_content_chars:
+            file_content = file_content[:max_content_chars]
+
+        return success, file_content
+
+    # Internal method starts with _
+    def _extract_content(self, file_path):
+        """Extract the content of the file using the text fast path or MarkItDown"""
 
         # Get file extension
-        file_extension = os.path.splitext(file_path)[1]
+        file_extension = os.path.splitext(file_path)[1].lower()
 
-        # Special case for MarkItDown
-        if file_extension in self.markitdown_excluded_extensions:
-            if file_extension == ".md":
-                with open(file_path, "r") as f:
-                    file_content = f.read()
-                print(f"\n\n\n-----------------\n\n\n# FileProcessor extract_content Special Case Response:\n\n{file_content}")
-                return True, file_content
+        # Fast path for text formats, reads a bounded sample without MarkItDown
+        if file_extension in self.text_reader.supported_extensions:
+            return self.text_reader.read(file_path)
         
         # Extract content using MarkItDown
         else:
-            # Get the LLM provider to use provider-specific settings
-            llm_provider = self.settings.get('llm_provider')
-            print(f"\n\n\n-----------------\n\n\n# FileProcessor extract_content LLM Provider:\n\n{llm_provider}")
-
-            client = OpenAI(
-                api_key=self.settings.get(f'{llm_provider}_api_key'),
-                base_url=self.settings.get(f'{llm_provider}_api_base_url')
-            )
-
             try:
-                md = markitdown.MarkItDown(llm_client=client, llm_model=self.settings.get(f'{llm_provider}_model'))
+                md = self._get_markitdown()
 
                 result = md.convert(file_path)
                 print(f"\n\n\n-----------------\n\n\n# FileProcessor extract_content MarkItDown Response:\n\n{result.text_content}")
@@ -58,21 +94,331 @@ class FileProcessor:
                 return False, f"Error extracting file content: {str(e)}"
 
 
-    async def rename_file(self, file_path):
-        """Process the file by calling AIService and rename the file"""
-        # Extract file content asynchronously
-        success, file_content = self.extract_content(file_path)
+    # Internal method starts with _
+    def _get_markitdown(self):
+        """Return the MarkItDown converter for the current LLM settings, created once and reused across files"""
+        # Get the LLM provider to use provider-specific settings
+        llm_provider = self.settings.get('llm_provider')
+        markitdown_key = (
+            self.settings.get(f'{llm_provider}_api_key'),
+            self.settings.get(f'{llm_provider}_api_base_url'),
+            self.settings.get(f'{llm_provider}_model')
+        )
+
+        if self._markitdown is None or self._markitdown_key != markitdown_key:
+            print(f"\n\n\n-----------------\n\n\n# FileProcessor _get_markitdown LLM Provider:\n\n{llm_provider}")
+            api_key, api_base_url, model = markitdown_key
+            client = OpenAI(api_key=api_key, base_url=api_base_url)
+            self._markitdown = markitdown.MarkItDown(llm_client=client, llm_model=model)
+            self._markitdown_key = markitdown_key
+
+        return self._markitdown
+
+    def load_converters(self):
+        """Load the MarkItDown converters ahead of the first file"""
+        self._get_markitdown()
+
+    async def warm_up(self):
+        """Start the extraction workers with their converters loaded, so the first file does not pay for it"""
+        if self.settings.get('extraction_workers') > 0:
+            await self.extraction_pool.warm_up()
+        else:
+            await asyncio.to_thread(self.load_converters)
+
+    def uses_vision(self, file_path):
+        """Whether the file is an image named in a single vision request instead of captioned by MarkItDown first"""
+        return self.settings.get('vision_naming') and os.path.splitext(file_path)[1].lower() in self.image_extensions
+
+    def collect_files(self, paths):
+        """Expand files and directories (recursively) into the list of supported files"""
+        file_paths = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, _, file_names in os.walk(path):
+                    for file_name in sorted(file_names):
+                        # Skip the sidecar index of rename markers, it is a .json file too
+                        if file_name == self.rename_marker.SIDECAR_NAME:
+                            continue
+                        if os.path.splitext(file_name)[1].lower() in self.supported_extensions:
+                            file_paths.append(os.path.join(root, file_name))
+            elif os.path.splitext(path)[1].lower() in self.supported_extensions:
+                file_paths.append(path)
+        return file_paths
+
+    def begin_batch(self):
+        """Start a new batch, near-duplicate files within the batch share one LLM call and one memory budget"""
+        if self.settings.get('near_duplicate_clustering'):
+            self.near_duplicates = NearDuplicateIndex(
+                self.settings.get('near_duplicate_max_distance'),
+                self.settings.get('near_duplicate_max_clusters')
+            )
+
+        self.memory_governor = MemoryGovernor(self.settings.get('max_inflight_content_mb') * 1024 * 1024)
+
+        # Tier metrics are reported per batch, see end_batch
+        if self.ai_service is not None:
+            self.ai_service.model_router.reset()
+
+    def end_batch(self):
+        """End the current batch, report its peak memory and release the contents held for near-duplicate matching"""
+        if self.memory_governor is not None:
+            print(f"\n\n\n-----------------\n\n\n# FileProcessor end_batch Memory:\n\n{self.memory_governor.report()}")
+
+        # Per-tier metrics for tuning the model routing rules
+        if self.ai_service is not None and self.ai_service.model_router.metrics:
+            print(f"\n\n\n-----------------\n\n\n# FileProcessor end_batch Model Tiers:\n\n{self.ai_service.model_router.report()}")
+
+        self.near_duplicates = None
+        self.memory_governor = None
+
+        # Save the markers kept in sidecar indexes
+        self.rename_marker.flush()
+
+    async def rename_file(self, file_path, dry_run=False, use_cache=True):
+        """Process the file within the per-file deadline, so one hung file cannot hold up the whole batch
+
+        With dry_run, the new file name is returned without renaming the file. Without use_cache, files renamed by an
+        earlier run are processed again.
+        """
+        file_timeout = self.settings.get('file_timeout')
+
+        # Skip files renamed by an earlier run with the same settings, a stat and getxattr instead of extraction and the LLM
+        if use_cache and await self.is_processed(file_path):
+            print(f"\n\n\n-----------------\n\n\n# FileProcessor rename_file Skipped:\n\nAlready renamed: {file_path}")
+            return True, os.path.basename(file_path)
+
+        try:
+            success, message = await self._rename_file(file_path, dry_run)
+        except asyncio.TimeoutError:
+            print(f"\n\n\n-----------------\n\n\n# FileProcessor rename_file Error:\n\nDeadline of {file_timeout} seconds exceeded for {file_path}")
+            return False, f"Processing timed out after {file_timeout} seconds"
+
+        if success and not dry_run:
+            await asyncio.to_thread(self.mark_renamed, file_path, message)
+
+        return success, message
+
+    async def is_processed(self, file_path):
+        """Whether the file was renamed by an earlier run with the current settings and can be skipped"""
+        return bool(self.settings.get('skip_processed_files')) and await asyncio.to_thread(self.rename_marker.is_processed, file_path)
+
+    def mark_renamed(self, file_path, new_file_name):
+        """Mark a file renamed from file_path to new_file_name, so later runs skip it"""
+        if self.settings.get('skip_processed_files'):
+            self.rename_marker.mark(os.path.join(os.path.dirname(file_path), new_file_name))
+
+    def suggest_from_metadata(self, file_path):
+        """Return the name from the file's metadata if metadata naming is enabled and confident enough, otherwise None"""
+        if not self.settings.get('metadata_naming'):
+            return None
+
+        # Metadata names cannot follow a custom instruction, only the LLM can
+        if (self.settings.get('custom_instruction') or '').strip():
+            return None
+
+        # Reads the file, call it from a worker thread in async code
+        confidence, suggestion = self.metadata_namer.suggest(file_path)
+        if suggestion and confidence >= self.settings.get('metadata_confidence_threshold'):
+            return suggestion
+        return None
+
+    # Internal method starts with _
+    async def _rename_file(self, file_path, dry_run=False):
+        """Process the file by calling AIService and rename the file
+
+        The per-file deadline (file_timeout) only counts time spent working on the file, waiting for the memory budget
+        or a free extraction worker does not count. Raises asyncio.TimeoutError once the deadline is exceeded.
+        """
+        loop = asyncio.get_running_loop()
+        file_timeout = self.settings.get('file_timeout')
+
+        # Name the file from its metadata when confident enough, skipping extraction and the LLM call
+        suggestion = await asyncio.wait_for(asyncio.to_thread(self.suggest_from_metadata, file_path), timeout=file_timeout)
+        if suggestion:
+            return self.apply_suggestion(file_path, suggestion, dry_run)
+
+        # Reserve room for the extracted content in the batch's in-flight memory budget
+        memory_governor = self.memory_governor
+        reserved_bytes = self._estimate_content_bytes(file_path)
+        if memory_governor is not None:
+            await memory_governor.acquire(reserved_bytes)
+
+        try:
+            # Images go straight to the vision model, one async request instead of a blocking caption plus a naming call
+            if self.uses_vision(file_path):
+                deadline = loop.time() + file_timeout
+                success, image_url = await asyncio.wait_for(asyncio.to_thread(self.image_encoder.encode, file_path), timeout=file_timeout)
+                if not success:
+                    return False, image_url # Return the error message if the image could not be read
+
+                success, suggestion = await asyncio.wait_for(
+                    self.ai_service.get_image_suggestion(image_url, os.path.splitext(file_path)[1]),
+                    timeout=deadline - loop.time()
+                )
+                if not success:
+                    return False, suggestion # Return the error message if AI service call failed
+
+                return self.apply_suggestion(file_path, suggestion, dry_run)
+
+            # Extract file content outside the event loop, so it does not block other files in the batch
+            async with self._extraction_slot(file_path):
+                # The deadline starts once an extraction worker is free for this file
+                deadline = loop.time() + file_timeout
+                success, file_content = await self._extract(file_path, file_timeout)
+            if not success:
+                return False, file_content  # Return the error message if extraction failed
+
+            # Get original file extension
+            file_extension = os.path.splitext(file_path)[1]
+
+            # Get file name suggestion or error message from AIService
+            success, suggestion = await asyncio.wait_for(self._get_suggestion(file_content, file_extension), timeout=deadline - loop.time())
+            
+            if not success:
+                return False, suggestion # Return the error message if AI service call failed
+
+            return self.apply_suggestion(file_path, suggestion, dry_run)
+
+        finally:
+            if memory_governor is not None:
+                memory_governor.release(reserved_bytes)
+
+    # Internal method starts with _
+    def _estimate_content_bytes(self, file_path):
+        """Estimate the memory held by the extracted content of a file, bounded by the content cap"""
+        max_content_bytes = self.settings.get('max_content_chars') * 4 # Up to 4 bytes per character
+
+        # Encoded images are bounded by the vision size limit, base64 adds a third
+        if self.uses_vision(file_path):
+            max_side = self.settings.get('vision_max_image_side')
+            try:
+                return min(os.path.getsize(file_path), max_side * max_side * 3) * 4 // 3
+            except OSError:
+                return max_side * max_side * 4
+
+        # Text formats never extract to more than their size, other formats may expand (e.g. zipped Office files)
+        file_extension = os.path.splitext(file_path)[1].lower()
+        if file_extension in self.text_reader.supported_extensions:
+            try:
+                return min(os.path.getsize(file_path), max_content_bytes)
+            except OSError:
+                pass
+
+        return max_content_bytes
+
+    # Internal method starts with _
+    @contextlib.asynccontextmanager
+    async def _extraction_slot(self, file_path):
+        """Wait for a free extraction worker, so files queued behind others do not use up their deadline waiting"""
+        # The text fast path is cheap and not bounded
+        if os.path.splitext(file_path)[1].lower() in self.text_reader.supported_extensions:
+            yield
+            return
+
+        # Each batch runs its own event loop and asyncio primitives are bound to one loop
+        loop = asyncio.get_running_loop()
+        if self._extraction_semaphore is None or self._extraction_semaphore_loop is not loop:
+            self._extraction_semaphore = asyncio.Semaphore(max(1, self.settings.get('extraction_workers')))
+            self._extraction_semaphore_loop = loop
+
+        async with self._extraction_semaphore:
+            yield
+
+    # Internal method starts with _
+    async def _extract(self, file_path, timeout=None):
+        """Extract file content in the extraction worker pool, text formats and a disabled pool use a thread
+
+        Raises asyncio.TimeoutError after timeout seconds.
+        """
+        file_extension = os.path.splitext(file_path)[1].lower()
+
+        if self.settings.get('extraction_workers') > 0 and file_extension not in self.text_reader.supported_extensions:
+            # The pool kills a worker stuck past the timeout, so the next file gets a free worker
+            return await self.extraction_pool.extract(file_path, self.memory_governor, timeout=timeout)
+
+        # Before Python 3.12 the batch profile only covers the event loop thread, profile the extraction in its thread too
+        if self.profiler.is_enabled():
+            return await asyncio.wait_for(asyncio.to_thread(self.profiler.profile_thread_call, self.extract_content, file_path), timeout=timeout)
+
+        return await asyncio.wait_for(asyncio.to_thread(self.extract_content, file_path), timeout=timeout)
+
+    async def prepare_request(self, file_path):
+        """Prepare a file for batch mode, returns ('skipped', None), ('suggestion', name) from metadata, ('request', body) or ('error', message)"""
+        # Already renamed by an earlier run with the same settings
+        if await self.is_processed(file_path):
+            return 'skipped', None
+
+        # Name the file from its metadata when confident enough, no request needed
+        suggestion = await asyncio.to_thread(self.suggest_from_metadata, file_path)
+        if suggestion:
+            return 'suggestion', suggestion
+
+        # Images are sent to the vision model as they are, batch mode supports vision requests too
+        if self.uses_vision(file_path):
+            success, image_url = await asyncio.to_thread(self.image_encoder.encode, file_path)
+            if not success:
+                return 'error', image_url
+            return 'request', self.ai_service.build_image_request(image_url)
+
+        success, file_content = await self._extract(file_path)
         if not success:
-            return False, file_content  # Return the error message if extraction failed
+            return 'error', file_content
 
-        # Get original file extension
-        file_extension = os.path.splitext(file_path)[1]
+        return 'request', self.ai_service.build_request(file_content)
 
-        # Get file name suggestion or error message from AIService
-        success, suggestion = await self.ai_service.get_suggestion(file_content, file_extension)
-        
+    # Internal method starts with _
+    async def _get_suggestion(self, file_content, file_extension):
+        """Get a file name suggestion, reusing the suggestion of a near-duplicate file in the same batch"""
+        near_duplicates = self.near_duplicates
+        if near_duplicates is None:
+            return await self.ai_service.get_suggestion(file_content, file_extension)
+
+        # Fingerprint in a worker thread, it is CPU-bound on long contents
+        fingerprint = await asyncio.to_thread(near_duplicates.fingerprint, file_content)
+        if fingerprint is None:
+            return await self.ai_service.get_suggestion(file_content, file_extension)
+
+        # Register as cluster representative, or find the representative of an existing cluster
+        future = asyncio.get_running_loop().create_future()
+        # Only the representative's token set is kept, not its content, so the index stays small
+        representative = near_duplicates.find_or_add(fingerprint, (future, near_duplicates.suffix_tokens(file_content)))
+
+        if representative is None:
+            try:
+                result = await self.ai_service.get_suggestion(file_content, file_extension)
+                future.set_result(result)
+                return result
+            finally:
+                # Release waiting near-duplicates if this file failed or timed out, they fall back to their own call
+                if not future.done():
+                    future.set_result((False, "Cluster representative failed"))
+
+        # Wait for the representative's suggestion, shielded so a timeout here does not cancel it for others
+        representative_future, representative_tokens = representative
+        success, suggestion = await asyncio.shield(representative_future)
         if not success:
-            return False, suggestion # Return the error message if AI service call failed
+            return await self.ai_service.get_suggestion(file_content, file_extension)
+
+        # Tell this file apart from the representative locally, without another LLM call
+        suffix = near_duplicates.differentiating_suffix(file_content, representative_tokens)
+        if suffix:
+            suggestion = self.metadata_namer.append_to_name(suggestion, suffix)
+
+        print(f"\n\n\n-----------------\n\n\n# FileProcessor _get_suggestion Near-duplicate:\n\nReused cluster suggestion: {suggestion}")
+        return True, suggestion
+
+    # Internal method starts with _
+    def _remember_rename(self, new_file_path):
+        """Record a renamed file path, forgetting renames older than a minute once many have piled up"""
+        now = time.monotonic()
+        if len(self.recently_renamed) > 1000:
+            self.recently_renamed = {path: renamed_at for path, renamed_at in self.recently_renamed.items() if now - renamed_at < 60}
+        self.recently_renamed[os.path.abspath(new_file_path)] = now
+
+    def apply_suggestion(self, file_path, suggestion, dry_run=False):
+        """Rename the file to the suggested name, keeping the original extension, with dry_run only return the new name"""
+        # Get original file extension
+        file_extension = os.path.splitext(file_path)[1]
 
         # Rename the file
         try:
@@ -92,7 +438,14 @@ class FileProcessor:
                 while os.path.exists(f"{base}_{counter}{ext}"):
                     counter += 1
                 new_file_path = f"{base}_{counter}{ext}"
+
+            # Only report the new name in a dry run
+            if dry_run:
+                return True, os.path.basename(new_file_path)
             
+            # Remember the new path, so the folder watcher does not pick up our own rename as a new file
+            self._remember_rename(new_file_path)
+
             # Rename the file
             os.rename(file_path, new_file_path)
             print(f"\n\n\n-----------------\n\n\n# FileProcessor process_file New File Path:\n\n{(os.path.basename(new_file_path))}")
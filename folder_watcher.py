@@ -0,0 +1,206 @@
+import ctypes
+import ctypes.util
+import asyncio
+import struct
+import sys
+import os
+
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+# inotify_init1 flags
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+# struct inotify_event header: wd, mask, cookie, len (followed by the name)
+EVENT_HEADER = struct.Struct('iIII')
+
+class FolderWatcher:
+    """Watch-folder daemon: picks up new files through inotify, debounces them and renames them with bounded concurrency"""
+
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+    def __init__(self, settings, file_processor):
+        self.settings = settings
+        self.file_processor = file_processor
+
+        self._fd = None
+        self._watches = {} # Watch descriptor -> directory
+        self._debounce_handles = {} # File path -> scheduled stability check
+        self._in_flight = set() # Files being renamed
+        self._active_count = 0 # Files being renamed, a batch spans each burst of activity
+        self._semaphore = None
+
+    # Internal method starts with _
+    def _log(self, title, message):
+        """Utility method for debugging purposes"""
+        print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
+
+    async def run(self, directories):
+        """Watch the directories (and their subdirectories) until cancelled"""
+        if not sys.platform.startswith('linux'):
+            return False, "Watch mode requires inotify, which is only available on Linux"
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            return False, f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}"
+
+        loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.settings.get('watch_max_concurrency'))
+
+        try:
+            for directory in directories:
+                for root, _, _ in os.walk(directory):
+                    self._add_watch(root)
+
+            if not self._watches:
+                return False, "No directories to watch"
+
+            # The event loop wakes us up when events arrive, no polling
+            loop.add_reader(self._fd, self._on_readable)
+            self._log("FolderWatcher run", "Watching:\n" + "\n".join(self._watches.values()))
+            await asyncio.Event().wait()
+
+        finally:
+            loop.remove_reader(self._fd)
+            for handle in self._debounce_handles.values():
+                handle.cancel()
+            os.close(self._fd)
+            self._fd = None
+
+    # Internal method starts with _
+    def _add_watch(self, directory):
+        """Add an inotify watch for a directory"""
+        watch_descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.WATCH_MASK)
+        if watch_descriptor < 0:
+            self._log("FolderWatcher _add_watch Error", f"{directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._watches[watch_descriptor] = directory
+
+    # Internal method starts with _
+    def _add_directory(self, directory):
+        """Watch a directory created or moved in, with its subdirectories, and pick up the files already in it"""
+        # A folder moved into place arrives complete, and files written before the watch existed raised no events
+        for root, _, file_names in os.walk(directory):
+            self._add_watch(root)
+            for file_name in file_names:
+                self._schedule(os.path.join(root, file_name))
+
+    # Internal method starts with _
+    def _on_readable(self):
+        """Read and dispatch all pending inotify events"""
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+
+            offset = 0
+            while offset < len(data):
+                watch_descriptor, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + name_length].rstrip(b'\0')
+                offset += EVENT_HEADER.size + name_length
+                self._handle_event(watch_descriptor, mask, os.fsdecode(name))
+
+    # Internal method starts with _
+    def _handle_event(self, watch_descriptor, mask, name):
+        """Handle a single inotify event"""
+        if mask & IN_Q_OVERFLOW:
+            self._log("FolderWatcher Warning", "inotify event queue overflowed, some files may have been missed")
+            return
+
+        # Watched directory was removed
+        if mask & (IN_IGNORED | IN_DELETE_SELF):
+            self._watches.pop(watch_descriptor, None)
+            return
+
+        directory = self._watches.get(watch_descriptor)
+        if directory is None or not name:
+            return
+        path = os.path.abspath(os.path.join(directory, name))
+
+        # Watch new subdirectories as well
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_directory(path)
+            return
+
+        # Files are only complete once closed after writing or moved in, creation alone is not enough
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self._schedule(path)
+
+    # Internal method starts with _
+    def _schedule(self, path):
+        """Debounce a file, each new event for it restarts the wait"""
+        # Our own rename shows up as a file moved into the directory
+        if self.file_processor.recently_renamed.pop(path, None) is not None:
+            return
+
+        if path in self._in_flight or os.path.splitext(path)[1].lower() not in self.file_processor.supported_extensions:
+            return
+
+        # Sidecar index of rename markers, written by Renami itself
+        if os.path.basename(path) == self.file_processor.rename_marker.SIDECAR_NAME:
+            return
+
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        handle = self._debounce_handles.pop(path, None)
+        if handle is not None:
+            handle.cancel()
+
+        loop = asyncio.get_running_loop()
+        self._debounce_handles[path] = loop.call_later(self.settings.get('watch_debounce_seconds'), self._check_stable, path, size)
+
+    # Internal method starts with _
+    def _check_stable(self, path, size):
+        """Start renaming the file if its size stopped changing, otherwise wait again"""
+        self._debounce_handles.pop(path, None)
+
+        try:
+            current_size = os.path.getsize(path)
+        except OSError:
+            return # File was removed or moved away meanwhile
+
+        # Still being written
+        if current_size != size:
+            self._schedule(path)
+            return
+
+        self._in_flight.add(path)
+        asyncio.get_running_loop().create_task(self._rename(path))
+
+    # Internal method starts with _
+    async def _rename(self, path):
+        """Rename a new file with bounded concurrency"""
+        try:
+            async with self._semaphore:
+                # Each burst of activity is one batch, so near-duplicates arriving together share one LLM call
+                if self._active_count == 0:
+                    self.file_processor.begin_batch()
+                self._active_count += 1
+
+                try:
+                    success, message = await self.file_processor.rename_file(path)
+                    self._log("FolderWatcher Result", f"{path}: {'Renamed to ' if success else 'Failed: '}{message}")
+                finally:
+                    self._active_count -= 1
+                    if self._active_count == 0:
+                        self.file_processor.end_batch()
+
+        except Exception as e:
+            self._log("FolderWatcher _rename Error", f"{path}: {e}")
+
+        finally:
+            self._in_flight.discard(path)
@@ -0,0 +1,69 @@
+import base64
+import io
+import os
+
+# Pillow is optional, images are sent unchanged without it
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+class ImageEncoder:
+    """Prepares images for the vision model: downscaled, re-encoded and embedded as a data URL"""
+
+    MIME_TYPES = {
+        '.jpg': 'image/jpeg',
+        '.jpeg': 'image/jpeg',
+        '.png': 'image/png',
+    }
+
+    JPEG_QUALITY = 85
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def encode(self, file_path):
+        """Return (success, data URL) of the image, or (success, error message)"""
+        file_extension = os.path.splitext(file_path)[1].lower()
+        if file_extension not in self.MIME_TYPES:
+            return False, f"Unsupported image format: {file_extension}"
+
+        try:
+            if Image is None:
+                with open(file_path, 'rb') as f:
+                    image_bytes = f.read()
+                mime_type = self.MIME_TYPES[file_extension]
+            else:
+                image_bytes, mime_type = self._downscale(file_path)
+
+        except Exception as e:
+            print(f"\n\n\n-----------------\n\n\n# ImageEncoder encode Error:\n\n{str(e)}")
+            return False, f"Error reading image: {str(e)}"
+
+        if not image_bytes:
+            return False, "Blank file"
+
+        return True, f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode('ascii')}"
+
+    # Internal method starts with _
+    def _downscale(self, file_path):
+        """Fit the image within vision_max_image_side pixels and re-encode it as JPEG, returns (bytes, MIME type)"""
+        max_side = self.settings.get('vision_max_image_side')
+
+        with Image.open(file_path) as image:
+            # Apply the EXIF orientation, the model should see the photo upright
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_side, max_side))
+
+            # JPEG has no alpha channel, flatten transparent images onto white
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=self.JPEG_QUALITY)
+            return buffer.getvalue(), 'image/jpeg'
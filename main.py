@@ -1,17 +1,111 @@
+import multiprocessing
+import argparse
+import asyncio
 from settings import Settings
 from ai_service import AIService
 from file_processor import FileProcessor
-from main_window import MainWindow
+from batch_job import BatchJob
+from folder_watcher import FolderWatcher
+from profiler import Profiler
+from batch_planner import BatchPlanner
+from work_queue import open_work_queue
+from queue_worker import QueueWorker
+
+def parse_args():
+    """Parse command line arguments, no command starts the desktop application"""
+    parser = argparse.ArgumentParser(description="Renami - AI File Renamer")
+    subparsers = parser.add_subparsers(dest='command')
+
+    # Offline batch mode for very large jobs
+    batch_parser = subparsers.add_parser('batch', help="Rename files through the provider's Batch API")
+    batch_parser.add_argument('paths', nargs='*', help="Files or directories to rename, omit to resume an existing job")
+    batch_parser.add_argument('--state', default='renami_batch.json', help="State file of the job, used to resume it")
+    batch_parser.add_argument('--ignore-budget', action='store_true', help="Run even if the estimated cost exceeds the budget cap")
+
+    # Watch-folder daemon mode
+    watch_parser = subparsers.add_parser('watch', help="Rename new files arriving in watched directories")
+    watch_parser.add_argument('directories', nargs='*', help="Directories to watch, defaults to watch_directories from settings")
+
+    # Distributed work queue shared by headless workers
+    queue_parser = subparsers.add_parser('queue', help="Share a rename job between workers on several machines")
+    queue_parser.add_argument('action', choices=('enqueue', 'work', 'status'), help="Add files to the queue, work on it or show its progress")
+    queue_parser.add_argument('paths', nargs='*', help="Files or directories to add (enqueue only)")
+    queue_parser.add_argument('--queue', required=True, help="Queue location, a SQLite file path (e.g. on a network share) or a backend URL")
+    queue_parser.add_argument('--worker-id', help="Name of this worker in the queue, defaults to host name and process id")
+
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+
     # Initialize components
     settings = Settings()
     ai_service = AIService(settings)
     file_processor = FileProcessor(settings, ai_service)
+    profiler = Profiler(settings)
+
+    if args.command == 'batch':
+        file_paths = file_processor.collect_files(args.paths)
+        batch_job = BatchJob(settings, ai_service, file_processor, args.state)
+
+        # New files cannot be added to an existing job, check before estimating them
+        if file_paths and not batch_job.is_new():
+            print(f"{args.state} belongs to an existing job, run without paths to resume it or use another --state")
+            return
+
+        # Estimate the cost of a new job and stop if it exceeds the budget cap
+        if file_paths:
+            batch_planner = BatchPlanner(settings, file_processor, ai_service)
+            # A batch goes to the provider's model as a whole, routing rules do not apply
+            estimates, summary = batch_planner.plan(file_paths, routed=False)
+            print(batch_planner.describe(summary))
+            if summary['over_budget'] and not args.ignore_budget:
+                print("Estimated cost exceeds the budget cap, use --ignore-budget to run anyway")
+                return
+            file_paths = batch_planner.order(estimates)
+
+        success, message = asyncio.run(profiler.run(batch_job.run(file_paths)))
+        print(message)
+
+    elif args.command == 'watch':
+        folder_watcher = FolderWatcher(settings, file_processor)
+        try:
+            success, message = asyncio.run(profiler.run(folder_watcher.run(args.directories or settings.get('watch_directories'))))
+            print(message)
+        except KeyboardInterrupt:
+            pass
+
+    elif args.command == 'queue':
+        work_queue = open_work_queue(args.queue, max_attempts=settings.get('queue_max_attempts'))
+        try:
+            if args.action == 'enqueue':
+                # Largest extraction jobs first, so they do not end up as the tail of the job
+                batch_planner = BatchPlanner(settings, file_processor, ai_service)
+                estimates, summary = batch_planner.plan(file_processor.collect_files(args.paths))
+                print(batch_planner.describe(summary))
+                print(f"Added {work_queue.enqueue(batch_planner.order(estimates))} file(s) to the queue")
+
+            elif args.action == 'work':
+                queue_worker = QueueWorker(settings, file_processor, work_queue, args.worker_id)
+                success, message = asyncio.run(profiler.run(queue_worker.run()))
+                print(message)
+
+            print(work_queue.stats())
+        finally:
+            work_queue.close()
+
+    else:
+        # Imported here, so headless modes do not need a display
+        from main_window import MainWindow
+
+        # Initialize main window
+        app = MainWindow(settings, file_processor, ai_service)
+        app.mainloop()
 
-    # Initialize main window
-    app = MainWindow(settings, file_processor, ai_service)
-    app.mainloop()
+    # Stop extraction worker processes
+    file_processor.extraction_pool.shutdown()
 
 if __name__ == "__main__":
+    # Required for extraction worker processes in the packaged executable
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
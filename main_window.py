@@ -2,6 +2,9 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import TkinterDnD, DND_FILES
 from settings_view import SettingsFrame
+from profiler import Profiler
+from batch_planner import BatchPlanner
+from renami_engine import RenamiEngine
 import os
 import threading
 import asyncio
@@ -14,6 +17,9 @@ class MainWindow(TkinterDnD.Tk):
         self.settings = settings
         self.file_processor = file_processor
         self.ai_service = ai_service
+        self.profiler = Profiler(settings)
+        self.batch_planner = BatchPlanner(settings, file_processor, ai_service)
+        self.engine = RenamiEngine(settings, ai_service, file_processor)
         
         # Add processing status flag
         self.is_processing = False
@@ -38,7 +44,7 @@ class MainWindow(TkinterDnD.Tk):
         self.deiconify()
 
         # Supported file types
-        self.supported_extensions = ('.pdf', '.docx', '.doc', '.pptx', '.ppt', '.xlsx', '.xls', '.jpg', '.jpeg', '.png', '.txt', '.md', '.json', '.csv', 'xml', '.html')
+        self.supported_extensions = self.file_processor.supported_extensions
         self.displayed_supported_extensions = ('PDF', 'PowerPoint', 'Word', 'Excel', 'Images (JPG, PNG)', 'HTML', 'Text-based formats (Markdown, CSV, JSON, XML)')
 
 
@@ -53,6 +59,10 @@ class MainWindow(TkinterDnD.Tk):
         # Show main frame initially
         self.show_main_view()
 
+        # Warm up the API client and extraction workers once the window is visible
+        if self.settings.get('warm_up_on_startup'):
+            self.after(100, lambda: threading.Thread(target=self._warm_up_thread, daemon=True).start())
+
     def create_main_frame(self):
         """Create primary view frame"""
         # Create main frame
@@ -192,6 +202,18 @@ class MainWindow(TkinterDnD.Tk):
         # Schedule return to original color for flash effect
         self.after(miliseconds, lambda: label.configure(foreground=current_color))
 
+    def _warm_up_thread(self):
+        """Dedicated thread for warming up, so the first dropped file is as fast as later ones"""
+        async def warm_up():
+            results = await asyncio.gather(
+                self.ai_service.warm_up(),
+                self.file_processor.warm_up(),
+                return_exceptions=True # Warm-up is best effort, failures show up again when processing files
+            )
+            print(f"\n\n\n-----------------\n\n\n# MainWindow warm_up Result:\n\n{results}")
+
+        asyncio.run(warm_up())
+
     def _files_processing_thread(self, file_paths):
         """"Dedicated thread for file processing"""
         # Set processing flag
@@ -204,25 +226,57 @@ class MainWindow(TkinterDnD.Tk):
         ])
         
         # Disable settings button
-        self.settings_button.configure(state='disabled')
-
-        # Process files using asyncio.run
-        results = asyncio.run(self.process_files(file_paths)) # blocking call - will wait until the process is finished before moving to the next line
-
-        # Update status label AFTER processing
-        self.after(0, self._update_final_status, results, file_paths)
-        
-        # Reset processing flag
-        self.is_processing = False
-
-        # Restore drop label
-        self.after(0, lambda: [
-            self.drop_label.configure(text="Drag and drop files here\nor click to select files"),
-            self.drop_label.configure(foreground='black')
-        ])
-
-        # Restore settings button
-        self.settings_button.configure(state='normal')
+        self.after(0, lambda: self.settings_button.configure(state='disabled'))
+
+        try:
+            # Estimate tokens and cost before starting
+            estimates, summary = self.batch_planner.plan(file_paths)
+            estimate_text = self.batch_planner.describe(summary)
+            self.after(0, lambda: self.status_label.configure(text=estimate_text, foreground="black"))
+
+            # Ask before going over the budget cap
+            if summary['over_budget'] and not self._ask_yes_no("Budget Exceeded", f"{estimate_text}\n\nProcess the files anyway?"):
+                self.after(0, lambda: self.status_label.configure(text=f"❌ Cancelled: {estimate_text}", foreground="red"))
+            else:
+                # Process files using asyncio.run (profiled if profiling is enabled), largest extraction jobs first
+                ordered_file_paths = self.batch_planner.order(estimates)
+                results = asyncio.run(self.profiler.run(self.process_files(ordered_file_paths))) # blocking call - will wait until the process is finished before moving to the next line
+
+                # Update status label AFTER processing
+                self.after(0, self._update_final_status, results, file_paths)
+
+        except Exception as e:
+            error_text = f"❌ Failed to process the files: {e}"
+            self.after(0, lambda: self.status_label.configure(text=error_text, foreground="red"))
+
+        finally:
+            # Reset processing flag
+            self.is_processing = False
+
+            # Restore drop label
+            self.after(0, lambda: [
+                self.drop_label.configure(text="Drag and drop files here\nor click to select files"),
+                self.drop_label.configure(foreground='black')
+            ])
+
+            # Restore settings button
+            self.after(0, lambda: self.settings_button.configure(state='normal'))
+
+    # Internal method starts with _
+    def _ask_yes_no(self, title, message):
+        """Ask a yes/no question from the processing thread, Tk dialogs must be shown on the main thread"""
+        answered = threading.Event()
+        answer = []
+
+        def ask():
+            try:
+                answer.append(messagebox.askyesno(title, message))
+            finally:
+                answered.set()
+
+        self.after(0, ask)
+        answered.wait()
+        return bool(answer and answer[0])
 
     def _update_final_status(self, results, file_paths):
         """Update final processing status after all files have been processed"""
@@ -243,46 +297,30 @@ class MainWindow(TkinterDnD.Tk):
             self.status_label.configure(text=f"❌ Failed to process all {total_count} file(s)", foreground="red")
 
     async def process_files(self, file_paths):
-        """Process files concurrently and update processing status"""
-        async def process_single_file(file_path):
-            # Check if file exists
-            if not os.path.exists(file_path):
-                messagebox.showerror("Error", f"File not found: {file_path}")
-                return False
-
-            # Check if file type is supported
-            file_extension = os.path.splitext(file_path)[1].lower()
-            if file_extension not in self.supported_extensions:
-                messagebox.showerror("Error", f"Unsupported file type: {file_extension}")
-                self._flash_label_warning(self.supported_file_types_label, miliseconds=2000)
-                return False
-
-            # Check if API key is set
-            llm_provider = self.settings.get("llm_provider")
-            if not self.settings.get(f"{llm_provider}_api_key"):
-                messagebox.showerror("Error", "Please set your API key first")
-                self.show_settings_view()
-                return False
-        
-            # Update status label before processing a single file
-            self.after(0, self._update_processing_status, os.path.basename(file_path))
-
-            # Call process_file method passed from file_processor
-            success, message = await self.file_processor.rename_file(file_path)
+        """Process files concurrently through the engine and update processing status"""
+        # Check if API key is set
+        llm_provider = self.settings.get("llm_provider")
+        if not self.settings.get(f"{llm_provider}_api_key"):
+            self.after(0, lambda: [messagebox.showerror("Error", "Please set your API key first"), self.show_settings_view()])
+            return [False] * len(file_paths)
+
+        def announced_file_paths():
+            # The engine takes each path when it starts processing it
+            for file_path in file_paths:
+                self.after(0, self._update_processing_status, os.path.basename(file_path))
+                yield file_path
+
+        results = []
+        async for result in self.engine.rename(announced_file_paths()):
+            file_extension = os.path.splitext(result.file_path)[1].lower()
+            if not result.success and file_extension not in self.supported_extensions:
+                self.after(0, self._flash_label_warning, self.supported_file_types_label, 2000)
 
             # Update status label after processing a single file
-            self.after(0, self._update_processing_status, os.path.basename(file_path), success, message)
+            self.after(0, self._update_processing_status, os.path.basename(result.file_path), result.success, result.message)
+            results.append(result.success)
 
-            return success
-        
-        # Create and gather concurrent tasks
-        tasks = []
-        for file_path in file_paths:
-            task = asyncio.create_task(process_single_file(file_path))
-            tasks.append(task)
-
-        # Gather results
-        return await asyncio.gather(*tasks, return_exceptions=True) # return_exceptions=True will not stop the process even if one of the tasks raises an exception
+        return results
 
     def _update_processing_status(self, original_file_name, success=None, message=None):
         """Update status label before processing a file"""
@@ -0,0 +1,67 @@
+import asyncio
+import os
+
+# psutil is optional, /proc is used on Linux without it
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+class MemoryGovernor:
+    """Bounds the extracted content held in memory across a batch and tracks peak memory usage"""
+
+    def __init__(self, max_inflight_bytes):
+        self.max_inflight_bytes = max_inflight_bytes
+        self.inflight_bytes = 0
+        self.peak_inflight_bytes = 0
+        self.peak_rss = 0
+        self.peak_worker_rss = 0
+        self._released = asyncio.Event()
+
+    @staticmethod
+    def current_rss():
+        """Return the resident set size of the current process in bytes, or None if it cannot be read"""
+        if psutil is not None:
+            return psutil.Process().memory_info().rss
+
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    async def acquire(self, nbytes):
+        """Wait until nbytes fit in the in-flight budget, a single oversized file is let through alone"""
+        while self.inflight_bytes > 0 and self.inflight_bytes + nbytes > self.max_inflight_bytes:
+            self._released.clear()
+            await self._released.wait()
+
+        self.inflight_bytes += nbytes
+        self.peak_inflight_bytes = max(self.peak_inflight_bytes, self.inflight_bytes)
+
+    def release(self, nbytes):
+        """Return nbytes to the in-flight budget, synchronous so it is safe in finally blocks of cancelled tasks"""
+        self.inflight_bytes -= nbytes
+        self.record_rss(self.current_rss())
+
+        # Wake up all waiting files, each one checks again whether it fits
+        self._released.set()
+
+    def record_rss(self, rss, worker=False):
+        """Record a resident set size sample of this process or of an extraction worker"""
+        if not rss:
+            return
+        if worker:
+            self.peak_worker_rss = max(self.peak_worker_rss, rss)
+        else:
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def report(self):
+        """Return a summary of the peak memory usage of the batch"""
+        megabyte = 1024 * 1024
+        return (
+            f"Peak in-flight content: {self.peak_inflight_bytes / megabyte:.1f} MB "
+            f"(limit {self.max_inflight_bytes / megabyte:.1f} MB), "
+            f"peak RSS: {self.peak_rss / megabyte:.1f} MB, "
+            f"peak extraction worker RSS: {self.peak_worker_rss / megabyte:.1f} MB"
+        )
@@ -0,0 +1,323 @@
+import xml.etree.ElementTree as ET
+import zipfile
+import struct
+import os
+import re
+
+class MetadataNamer:
+    """Offline naming engine that names files from their embedded metadata, so confident files skip the LLM"""
+
+    office_extensions = ('.docx', '.pptx', '.xlsx')
+    exif_extensions = ('.jpg', '.jpeg')
+
+    # Bytes scanned at the start and end of a PDF for the document info dictionary and XMP metadata
+    PDF_SCAN_BYTES = 64 * 1024
+
+    # EXIF lives in the APP1 segment at the start of a JPEG, which is at most 64KB
+    JPEG_SCAN_BYTES = 128 * 1024
+
+    # Titles set by authoring tools or scanners that say nothing about the content
+    GENERIC_TITLE_PATTERN = re.compile(
+        r'^(untitled.*|title|document\s*\d*|presentation\s*\d*|workbook\s*\d*|book\s*\d*|slide\s*\d+|'
+        r'powerpoint presentation|new document|scan.*|scanned document.*|img[_-]?\d+|dsc[_-]?\d+|'
+        r'microsoft (word|powerpoint|excel) - .*|无标题.*|文档\s*\d*)$',
+        re.IGNORECASE
+    )
+
+    # Titles that are really file names or paths
+    FILE_NAME_PATTERN = re.compile(r'(\.[a-z0-9]{2,4}$)|[\\/]', re.IGNORECASE)
+
+    CJK_PATTERN = re.compile(r'[一-鿿]')
+
+    OFFICE_NAMESPACES = {
+        'cp': 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties',
+        'dc': 'http://purl.org/dc/elements/1.1/',
+        'dcterms': 'http://purl.org/dc/terms/'
+    }
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    # Internal method starts with _
+    def _log(self, title, message):
+        """Utility method for debugging purposes"""
+        print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
+
+    def suggest(self, file_path):
+        """Suggest a file name from metadata, returns (confidence, suggestion) with confidence between 0 and 1"""
+        file_extension = os.path.splitext(file_path)[1].lower()
+
+        try:
+            if file_extension == '.pdf':
+                confidence, name = self._score_title(self._read_pdf_title(file_path))
+            elif file_extension in self.office_extensions:
+                confidence, name = self._score_title(self._read_office_title(file_path))
+            elif file_extension in self.exif_extensions:
+                confidence, name = self._score_photo(self._read_exif(file_path))
+            else:
+                return 0.0, None
+
+        # Malformed metadata only means the LLM has to name the file
+        except (OSError, ValueError, KeyError, IndexError, struct.error, zipfile.BadZipFile, ET.ParseError) as e:
+            self._log("MetadataNamer suggest Error", f"{file_path}: {e}")
+            return 0.0, None
+
+        if not name:
+            return 0.0, None
+
+        # Nothing left after applying the naming convention, e.g. a title of only underscores
+        suggestion = self.apply_naming_convention(name)
+        if not suggestion.strip():
+            return 0.0, None
+        self._log("MetadataNamer suggest Result", f"{file_path}: {suggestion} (confidence: {confidence:.2f})")
+        return confidence, suggestion
+
+    def apply_naming_convention(self, name):
+        """Apply the configured naming convention locally, mirroring the rules given to the LLM"""
+        naming_convention = self.settings.get('naming_convention')
+
+        # Naming conventions only apply to English names
+        if self.settings.get('naming_language') != 'en' or naming_convention == 'not-applicable':
+            return name
+
+        words = [word for word in re.split(r'[\s_]+', name) if word]
+        if not words:
+            return ""
+
+        if naming_convention == 'with-spaces':
+            return " ".join(word[0].upper() + word[1:] for word in words)
+        elif naming_convention == 'pascal-case':
+            return "".join(word[0].upper() + word[1:] for word in words)
+        elif naming_convention == 'camel-case':
+            return words[0].lower() + "".join(word[0].upper() + word[1:] for word in words[1:])
+        elif naming_convention == 'snake-case':
+            return "_".join(word.lower() for word in words)
+        elif naming_convention == 'kebab-case':
+            return "-".join(word.lower() for word in words)
+
+        return name
+
+    def append_to_name(self, name, suffix):
+        """Append words to a name that already follows the naming convention, leaving the name itself as it is"""
+        naming_convention = self.settings.get('naming_convention')
+        words = [word for word in re.split(r'[\s_]+', suffix) if word]
+        if not words:
+            return name
+
+        # Naming conventions only apply to English names
+        if self.settings.get('naming_language') != 'en' or naming_convention == 'not-applicable':
+            return " ".join([name] + words)
+
+        if naming_convention == 'with-spaces':
+            return " ".join([name] + [word[0].upper() + word[1:] for word in words])
+        elif naming_convention in ('pascal-case', 'camel-case'):
+            return name + "".join(word[0].upper() + word[1:] for word in words)
+        elif naming_convention == 'snake-case':
+            return "_".join([name] + [word.lower() for word in words])
+        elif naming_convention == 'kebab-case':
+            return "-".join([name] + [word.lower() for word in words])
+
+        return " ".join([name] + words)
+
+    # Internal method starts with _
+    def _score_title(self, title):
+        """Score how well a document title would work as a file name"""
+        if not title:
+            return 0.0, None
+
+        # Collapse whitespace and drop characters that are invalid in file names
+        title = re.sub(r'[<>:"/\\|?*]', ' ', title)
+        title = re.sub(r'\s+', ' ', title).strip()
+
+        if not title or self.GENERIC_TITLE_PATTERN.match(title) or self.FILE_NAME_PATTERN.search(title):
+            return 0.1, None
+
+        # Descriptive titles have a few words, single words and whole sentences are weaker
+        if self.CJK_PATTERN.search(title):
+            length_score = 0.9 if 4 <= len(title) <= 30 else 0.6
+        else:
+            word_count = len(title.split())
+            length_score = 0.9 if 2 <= word_count <= 12 else 0.6
+
+        # A title in another language would be translated by the LLM, leave it to the LLM
+        is_chinese = bool(self.CJK_PATTERN.search(title))
+        if (self.settings.get('naming_language') == 'zh-Hans') != is_chinese:
+            return 0.3, title
+
+        return length_score, title
+
+    # Internal method starts with _
+    def _score_photo(self, exif):
+        """Score a photo name built from the EXIF capture time and camera"""
+        date_time = exif.get('date_time')
+        camera = exif.get('camera')
+
+        # The capture time identifies a photo, the camera alone does not
+        if not date_time:
+            return 0.2, camera
+
+        # EXIF date time format is "YYYY:MM:DD HH:MM:SS"
+        match = re.match(r'(\d{4}):(\d{2}):(\d{2}) (\d{2}):(\d{2}):(\d{2})', date_time)
+        if not match or match.group(1) == '0000':
+            return 0.0, None
+
+        year, month, day, hour, minute, second = match.groups()
+        name = f"{year}-{month}-{day} {hour}{minute}{second}"
+        if camera:
+            return 0.9, f"{name} {camera}"
+        return 0.85, name
+
+    # Internal method starts with _
+    def _read_pdf_title(self, file_path):
+        """Read the title from the PDF document info dictionary or XMP metadata"""
+        with open(file_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            head = f.read(self.PDF_SCAN_BYTES)
+            f.seek(max(0, file_size - self.PDF_SCAN_BYTES))
+            tail = f.read(self.PDF_SCAN_BYTES)
+
+        # The info dictionary is usually written at the end, check the tail first
+        for data in (tail, head):
+            # XMP metadata: <dc:title><rdf:Alt><rdf:li xml:lang="x-default">Title</rdf:li>
+            xmp_match = re.search(rb'<dc:title>\s*<rdf:Alt>\s*<rdf:li[^>]*>(.*?)</rdf:li>', data, re.DOTALL)
+            if xmp_match:
+                return xmp_match.group(1).decode('utf-8', errors='ignore')
+
+        # Outline items and annotations have a /Title too, only the document info dictionary names the document
+        info_dictionary = self._find_pdf_info_dictionary(head, tail)
+        if info_dictionary is None:
+            return None
+
+        # Literal string: /Title (My Title)
+        literal_match = re.search(rb'/Title\s*\(((?:\\.|[^\\)])*)\)', info_dictionary, re.DOTALL)
+        if literal_match:
+            return self._decode_pdf_string(self._unescape_pdf_literal(literal_match.group(1)))
+
+        # Hex string: /Title <FEFF...>
+        hex_match = re.search(rb'/Title\s*<([0-9A-Fa-f\s]+)>', info_dictionary)
+        if hex_match:
+            return self._decode_pdf_string(bytes.fromhex(hex_match.group(1).decode('ascii')))
+
+        return None
+
+    # Internal method starts with _
+    def _find_pdf_info_dictionary(self, head, tail):
+        """Return the body of the object the trailer's /Info entry points to, None if it is not in the scanned bytes"""
+        for data in (tail, head):
+            # The last trailer (or cross-reference stream) wins, incremental updates append new ones
+            info_references = re.findall(rb'/Info\s+(\d+)\s+(\d+)\s+R', data)
+            if not info_references:
+                continue
+            object_number, generation = info_references[-1]
+
+            # Objects in compressed object streams cannot be read this way, the LLM names the file then
+            object_pattern = rb'(?<!\d)' + object_number + rb'\s+' + generation + rb'\s+obj\b(.*?)endobj'
+            for object_data in (tail, head):
+                objects = re.findall(object_pattern, object_data, re.DOTALL)
+                if objects:
+                    return objects[-1]
+            return None
+
+        return None
+
+    # Internal method starts with _
+    def _unescape_pdf_literal(self, raw):
+        """Resolve backslash escapes in a PDF literal string"""
+        escapes = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+        def replace(match):
+            escaped = match.group(1)
+            if escaped[:1].isdigit():
+                return bytes([int(escaped, 8) & 0xFF])
+            return escapes.get(escaped, escaped)
+
+        return re.sub(rb'\\([0-7]{1,3}|.)', replace, raw, flags=re.DOTALL)
+
+    # Internal method starts with _
+    def _decode_pdf_string(self, data):
+        """Decode a PDF text string, which is UTF-16 with a BOM or PDFDocEncoding"""
+        if data.startswith(b'\xfe\xff'):
+            return data[2:].decode('utf-16-be', errors='ignore')
+        if data.startswith(b'\xef\xbb\xbf'):
+            return data[3:].decode('utf-8', errors='ignore')
+        return data.decode('latin-1')
+
+    # Internal method starts with _
+    def _read_office_title(self, file_path):
+        """Read the title (or subject) from the core properties of a DOCX, PPTX or XLSX file"""
+        with zipfile.ZipFile(file_path) as archive:
+            if 'docProps/core.xml' not in archive.namelist():
+                return None
+            core = ET.fromstring(archive.read('docProps/core.xml'))
+
+        for tag in ('dc:title', 'dc:subject'):
+            element = core.find(tag, self.OFFICE_NAMESPACES)
+            if element is not None and element.text and element.text.strip():
+                return element.text.strip()
+
+        return None
+
+    # Internal method starts with _
+    def _read_exif(self, file_path):
+        """Read the capture time and camera from the EXIF block of a JPEG file"""
+        with open(file_path, 'rb') as f:
+            data = f.read(self.JPEG_SCAN_BYTES)
+
+        if data[:2] != b'\xff\xd8':
+            return {}
+
+        # Walk the JPEG segments until the APP1 EXIF segment or the start of the image data
+        offset = 2
+        while offset + 4 <= len(data) and data[offset] == 0xFF:
+            marker = data[offset + 1]
+            length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+
+            if marker == 0xE1 and data[offset + 4:offset + 10] == b'Exif\x00\x00':
+                return self._parse_tiff(data[offset + 10:offset + 2 + length])
+            if marker == 0xDA:
+                break
+
+            offset += 2 + length
+
+        return {}
+
+    # Internal method starts with _
+    def _parse_tiff(self, tiff):
+        """Parse the TIFF structure of an EXIF block for DateTimeOriginal, Make and Model"""
+        byte_order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+        if byte_order is None:
+            return {}
+
+        def read_ifd(ifd_offset):
+            entries = {}
+            entry_count = struct.unpack(byte_order + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+
+            for index in range(entry_count):
+                entry = ifd_offset + 2 + index * 12
+                tag, value_type, count = struct.unpack(byte_order + 'HHI', tiff[entry:entry + 8])
+
+                # ASCII values longer than 4 bytes are stored at an offset
+                if value_type == 2:
+                    value_offset = entry + 8
+                    if count > 4:
+                        value_offset = struct.unpack(byte_order + 'I', tiff[entry + 8:entry + 12])[0]
+                    entries[tag] = tiff[value_offset:value_offset + count].split(b'\x00')[0].decode('ascii', errors='ignore').strip()
+
+                # LONG values, used for the EXIF sub-IFD pointer
+                elif value_type == 4:
+                    entries[tag] = struct.unpack(byte_order + 'I', tiff[entry + 8:entry + 12])[0]
+
+            return entries
+
+        ifd0 = read_ifd(struct.unpack(byte_order + 'I', tiff[4:8])[0])
+        exif_ifd = read_ifd(ifd0[0x8769]) if 0x8769 in ifd0 else {}
+
+        # Model usually already includes the make, e.g. "Canon EOS R5"
+        make = ifd0.get(0x010F, '')
+        model = ifd0.get(0x0110, '')
+        camera = model if model.lower().startswith(make.lower()) else f"{make} {model}".strip()
+
+        return {
+            'date_time': exif_ifd.get(0x9003) or ifd0.get(0x0132),
+            'camera': camera or None
+        }
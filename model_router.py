@@ -0,0 +1,105 @@
+from collections import deque
+import statistics
+
+class ModelRouter:
+    """Chooses the model per file from the model_routes rules, and keeps per-tier metrics to tune them
+
+    Each rule may match on extensions, min_content_chars, max_content_chars and vision, the first matching rule wins:
+        {"name": "small-text", "model": "gpt-4o-mini", "extensions": [".txt", ".md"], "max_content_chars": 2000}
+    A rule may also name another provider and its own prices, files matching no rule use the provider's model.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.metrics = {} # Tier name -> metrics, see record
+
+    def default_tier(self):
+        """Return the tier of the provider's configured model"""
+        llm_provider = self.settings.get('llm_provider')
+        return {'name': 'default', 'provider': llm_provider, 'model': self.settings.get(f'{llm_provider}_model')}
+
+    def route(self, file_extension, content_chars, vision):
+        """Return the tier of the first rule matching the file, or the default tier"""
+        for rule in self.settings.get('model_routes') or []:
+            if self._matches(rule, (file_extension or '').lower(), content_chars, vision):
+                llm_provider = rule.get('provider') or self.settings.get('llm_provider')
+                return {
+                    'name': rule.get('name') or rule['model'],
+                    'provider': llm_provider,
+                    'model': rule['model'],
+                    'prompt_price_per_million_tokens': rule.get('prompt_price_per_million_tokens'),
+                    'completion_price_per_million_tokens': rule.get('completion_price_per_million_tokens')
+                }
+
+        return self.default_tier()
+
+    # Internal method starts with _
+    def _matches(self, rule, file_extension, content_chars, vision):
+        """Whether all conditions of a rule hold for the file, missing conditions always hold"""
+        if not rule.get('model'):
+            return False
+        if 'extensions' in rule and file_extension not in [extension.lower() for extension in rule['extensions']]:
+            return False
+        if 'vision' in rule and bool(rule['vision']) != vision:
+            return False
+        if 'min_content_chars' in rule and content_chars < rule['min_content_chars']:
+            return False
+        if 'max_content_chars' in rule and content_chars > rule['max_content_chars']:
+            return False
+        return True
+
+    def reset(self):
+        """Forget the metrics, e.g. at the start of a batch"""
+        self.metrics = {}
+
+    def prices(self, tier):
+        """Return the tier's (prompt, completion) price per million tokens, falling back to the configured prices"""
+        prompt_price = tier.get('prompt_price_per_million_tokens')
+        if prompt_price is None:
+            prompt_price = self.settings.get('prompt_price_per_million_tokens')
+        completion_price = tier.get('completion_price_per_million_tokens')
+        if completion_price is None:
+            completion_price = self.settings.get('completion_price_per_million_tokens')
+        return prompt_price, completion_price
+
+    def record(self, tier, success, latency, prompt_tokens=0, completion_tokens=0):
+        """Record the outcome of a request sent to a tier"""
+        metrics = self.metrics.setdefault(tier['name'], {
+            'model': tier['model'],
+            'requests': 0,
+            'failures': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'cost': 0.0,
+            'latencies': deque(maxlen=200) # Recent latencies for the median and p95
+        })
+
+        metrics['requests'] += 1
+        if not success:
+            metrics['failures'] += 1
+            return
+
+        prompt_price, completion_price = self.prices(tier)
+
+        metrics['prompt_tokens'] += prompt_tokens
+        metrics['completion_tokens'] += completion_tokens
+        metrics['cost'] += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+        metrics['latencies'].append(latency)
+
+    def report(self):
+        """Describe the metrics of each tier, one line per tier"""
+        lines = []
+        for name, metrics in self.metrics.items():
+            latencies = metrics['latencies']
+            successes = metrics['requests'] - metrics['failures']
+            median_latency = statistics.median(latencies) if latencies else 0
+            p95_latency = statistics.quantiles(latencies, n=20)[-1] if len(latencies) >= 2 else median_latency
+            cost_per_file = metrics['cost'] / successes if successes else 0
+
+            lines.append(
+                f"{name} ({metrics['model']}): {metrics['requests']} request(s), {metrics['failures']} failed, "
+                f"latency median {median_latency:.2f}s p95 {p95_latency:.2f}s, "
+                f"{metrics['prompt_tokens']:,} prompt / {metrics['completion_tokens']:,} completion tokens, "
+                f"${metrics['cost']:.4f} (${cost_per_file:.5f} per file)"
+            )
+        return "\n".join(lines) or "No requests"
@@ -0,0 +1,109 @@
+from collections import Counter, OrderedDict
+import hashlib
+import re
+
+class NearDuplicateIndex:
+    """SimHash fingerprints with an LSH band index, groups near-duplicate file contents within a batch"""
+
+    FINGERPRINT_BITS = 64
+
+    # Words, numbers, and single CJK characters (CJK text has no spaces between words)
+    TOKEN_PATTERN = re.compile(r'[一-鿿]|[^\W_]+')
+
+    # Suffix tokens are taken from the raw text, keeping joined tokens like 2024-02, INV-0042 or 1.2.3 whole
+    SUFFIX_TOKEN_PATTERN = re.compile(r'[一-鿿]|[^\W_]+(?:[-./][^\W_]+)*')
+
+    SHINGLE_SIZE = 3
+
+    # Contents with fewer tokens carry too little signal to be clustered
+    MIN_TOKENS = 20
+
+    # Leading tokens compared to tell near-duplicates apart, what differs (dates, numbers) is usually near the start
+    SUFFIX_SCAN_TOKENS = 512
+
+    def __init__(self, max_distance, max_clusters=1000):
+        self.max_distance = max_distance
+        self.max_clusters = max_clusters
+
+        # Any two fingerprints within max_distance bits agree on at least one of max_distance + 1 bands
+        self.band_count = max_distance + 1
+        self.band_bits = self.FINGERPRINT_BITS // self.band_count
+
+        self._bands = {} # (band index, band value) -> cluster ids
+        self._clusters = OrderedDict() # cluster id -> (fingerprint, value), oldest first
+        self._next_cluster_id = 0
+
+    def fingerprint(self, text):
+        """Compute the SimHash fingerprint of a text, or None if it is too short to be clustered"""
+        tokens = [token.lower() for token in self.TOKEN_PATTERN.findall(text)]
+        if len(tokens) < self.MIN_TOKENS:
+            return None
+
+        shingles = Counter(" ".join(tokens[i:i + self.SHINGLE_SIZE]) for i in range(len(tokens) - self.SHINGLE_SIZE + 1))
+
+        # Each shingle votes on every bit of the fingerprint, weighted by its count
+        weights = [0] * self.FINGERPRINT_BITS
+        for shingle, count in shingles.items():
+            shingle_hash = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+            for bit in range(self.FINGERPRINT_BITS):
+                weights[bit] += count if shingle_hash >> bit & 1 else -count
+
+        return sum(1 << bit for bit in range(self.FINGERPRINT_BITS) if weights[bit] > 0)
+
+    def find_or_add(self, fingerprint, value):
+        """Return the value of a near-duplicate cluster, or register value as a new cluster and return None"""
+        band_keys = self._band_keys(fingerprint)
+
+        # Only clusters sharing a band are candidates, compare their full fingerprints
+        for band_key in band_keys:
+            for cluster_id in self._bands.get(band_key, ()):
+                cluster_fingerprint, cluster_value = self._clusters[cluster_id]
+                if bin(cluster_fingerprint ^ fingerprint).count('1') <= self.max_distance:
+                    return cluster_value
+
+        # Forget the oldest cluster once the index is full, long-running batches would otherwise grow without bound
+        if len(self._clusters) >= self.max_clusters:
+            oldest_id, (oldest_fingerprint, _) = self._clusters.popitem(last=False)
+            for band_key in self._band_keys(oldest_fingerprint):
+                cluster_ids = self._bands[band_key]
+                cluster_ids.discard(oldest_id)
+                if not cluster_ids:
+                    del self._bands[band_key]
+
+        cluster_id = self._next_cluster_id
+        self._next_cluster_id += 1
+        self._clusters[cluster_id] = (fingerprint, value)
+        for band_key in band_keys:
+            self._bands.setdefault(band_key, set()).add(cluster_id)
+        return None
+
+    def suffix_tokens(self, text):
+        """Return the token set differentiating_suffix compares against, small enough to keep for the whole batch"""
+        return frozenset(token.lower() for token in self._leading_tokens(text))
+
+    def differentiating_suffix(self, text, representative_tokens, max_tokens=2):
+        """Pick a few tokens that tell a file apart from its cluster representative (see suffix_tokens), preferring numbers and dates"""
+        distinct_tokens = []
+        for token in self._leading_tokens(text):
+            if token.lower() not in representative_tokens and token not in distinct_tokens:
+                distinct_tokens.append(token)
+
+        # Numbers (dates, invoice numbers, versions) usually are what differs between near-duplicates
+        distinct_tokens.sort(key=lambda token: not any(char.isdigit() for char in token))
+        return " ".join(distinct_tokens[:max_tokens])
+
+    # Internal method starts with _
+    def _leading_tokens(self, text):
+        """Return the first SUFFIX_SCAN_TOKENS tokens of a text"""
+        tokens = []
+        for match in self.SUFFIX_TOKEN_PATTERN.finditer(text):
+            tokens.append(match.group())
+            if len(tokens) >= self.SUFFIX_SCAN_TOKENS:
+                break
+        return tokens
+
+    # Internal method starts with _
+    def _band_keys(self, fingerprint):
+        """Split a fingerprint into its LSH band keys"""
+        band_mask = (1 << self.band_bits) - 1
+        return [(band, fingerprint >> (band * self.band_bits) & band_mask) for band in range(self.band_count)]
@@ -0,0 +1,241 @@
+from datetime import datetime
+import tracemalloc
+import threading
+import cProfile
+import logging
+import asyncio
+import pstats
+import glob
+import time
+import sys
+import io
+import os
+
+class Profiler:
+    """Opt-in profiling of a batch: cProfile, tracemalloc and asyncio slow-callback reports saved to a file"""
+
+    # Number of entries shown per report section
+    TOP_FUNCTIONS = 40
+    TOP_ALLOCATIONS = 20
+    MAX_SLOW_CALLBACKS = 50
+
+    # Interval of the heartbeat task measuring event loop lag
+    HEARTBEAT_INTERVAL = 0.05
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._worker_call_count = 0
+        self._thread_call_count = 0
+        self._thread_call_lock = threading.Lock() # Thread calls are counted from several threads at once
+
+    # Internal method starts with _
+    def _log(self, title, message):
+        """Utility method for debugging purposes"""
+        print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
+
+    def is_enabled(self):
+        """Profiling is enabled by the RENAMI_PROFILE environment variable or the profiling setting"""
+        if os.environ.get('RENAMI_PROFILE', '').lower() in ('1', 'true', 'yes'):
+            return True
+        return bool(self.settings.get('profiling'))
+
+    def get_output_dir(self):
+        """Return the directory profiling reports are saved to, relative paths are relative to the config file"""
+        output_dir = self.settings.get('profile_output_dir')
+        if not os.path.isabs(output_dir):
+            output_dir = os.path.join(os.path.dirname(os.path.abspath(self.settings.config_file)), output_dir)
+        return output_dir
+
+    # Internal method starts with _
+    def _get_worker_dir(self):
+        """Return the directory extraction workers save their profiling data to"""
+        return os.path.join(self.get_output_dir(), 'workers')
+
+    # Internal method starts with _
+    def _get_thread_dir(self):
+        """Return the directory extraction threads of the event loop process save their profiling data to"""
+        return os.path.join(self.get_output_dir(), 'threads')
+
+    async def run(self, coro):
+        """Await the coroutine, profiling it and writing a report if profiling is enabled"""
+        if not self.is_enabled():
+            return await coro
+
+        loop = asyncio.get_running_loop()
+
+        # Remove worker and thread data of earlier runs
+        for data_dir in (self._get_worker_dir(), self._get_thread_dir()):
+            os.makedirs(data_dir, exist_ok=True)
+            for path in glob.glob(os.path.join(data_dir, '*.prof')):
+                os.remove(path)
+
+        # Asyncio debug mode logs every callback that blocks the loop for longer than slow_callback_duration
+        slow_callbacks = []
+        slow_callback_handler = _SlowCallbackHandler(slow_callbacks)
+        asyncio_logger = logging.getLogger('asyncio')
+        asyncio_logger.addHandler(slow_callback_handler)
+        previous_debug = loop.get_debug()
+        previous_slow_callback_duration = loop.slow_callback_duration
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.settings.get('profile_slow_callback_ms') / 1000
+
+        # Heartbeat measuring how late the loop wakes up, which catches blocking outside callbacks too
+        loop_lags = []
+        heartbeat = asyncio.create_task(self._heartbeat(loop_lags))
+
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start(25)
+
+        profile = cProfile.Profile()
+        start_time = time.perf_counter()
+        start_timestamp = time.time()
+        profile.enable()
+
+        try:
+            return await coro
+
+        finally:
+            profile.disable()
+            wall_time = time.perf_counter() - start_time
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+            heartbeat.cancel()
+            loop.set_debug(previous_debug)
+            loop.slow_callback_duration = previous_slow_callback_duration
+            asyncio_logger.removeHandler(slow_callback_handler)
+
+            report_path = self._write_report(profile, snapshot, slow_callbacks, loop_lags, wall_time, start_timestamp)
+            self._log("Profiler Report", f"Saved to {report_path}")
+
+    # Internal method starts with _
+    async def _heartbeat(self, loop_lags):
+        """Record how much later than scheduled the loop woke up the heartbeat"""
+        threshold = self.settings.get('profile_slow_callback_ms') / 1000
+
+        while True:
+            scheduled_at = time.perf_counter()
+            await asyncio.sleep(self.HEARTBEAT_INTERVAL)
+            lag = time.perf_counter() - scheduled_at - self.HEARTBEAT_INTERVAL
+            if lag > threshold:
+                loop_lags.append(lag)
+
+    # Internal method starts with _
+    def _write_report(self, profile, snapshot, slow_callbacks, loop_lags, wall_time, start_timestamp):
+        """Write the profiling report and return its path"""
+        output_dir = self.get_output_dir()
+        os.makedirs(output_dir, exist_ok=True)
+        report_path = os.path.join(output_dir, f"renami_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+
+        sections = [
+            "# Renami Profiling Report",
+            f"Wall time: {wall_time:.3f}s",
+            f"Slow callbacks (> {self.settings.get('profile_slow_callback_ms')} ms): {len(slow_callbacks)}",
+            f"Event loop blocked {len(loop_lags)} time(s), longest {max(loop_lags, default=0):.3f}s",
+            "",
+            "## Event loop thread, by cumulative time",
+            self._format_stats(pstats.Stats(profile), 'cumulative'),
+            "## Event loop thread, by own time",
+            self._format_stats(pstats.Stats(profile), 'tottime'),
+        ]
+
+        # Merge the profiles of all extraction worker calls
+        worker_profiles = glob.glob(os.path.join(self._get_worker_dir(), '*.prof'))
+        if worker_profiles:
+            worker_stats = pstats.Stats(*worker_profiles)
+            sections += [f"## Extraction workers ({len(worker_profiles)} call(s)), by cumulative time", self._format_stats(worker_stats, 'cumulative')]
+
+        # Before Python 3.12 cProfile only follows the thread that enabled it, extractions run with asyncio.to_thread are profiled separately
+        thread_profiles = glob.glob(os.path.join(self._get_thread_dir(), '*.prof'))
+        if thread_profiles:
+            thread_stats = pstats.Stats(*thread_profiles)
+            sections += [f"## Extraction threads ({len(thread_profiles)} call(s)), by cumulative time", self._format_stats(thread_stats, 'cumulative')]
+
+        sections += ["## Top allocation sites, event loop process", self._format_allocations(snapshot)]
+
+        # Latest snapshot of each extraction worker that ran during this batch
+        for path in glob.glob(os.path.join(self._get_worker_dir(), '*.tracemalloc')):
+            if os.path.getmtime(path) >= start_timestamp:
+                worker_name = os.path.splitext(os.path.basename(path))[0]
+                sections += [f"## Top allocation sites, extraction worker {worker_name}", self._format_allocations(tracemalloc.Snapshot.load(path))]
+
+        sections += ["## Slow callbacks"] + slow_callbacks[:self.MAX_SLOW_CALLBACKS]
+
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(sections) + "\n")
+
+        return report_path
+
+    # Internal method starts with _
+    def _format_stats(self, stats, sort_key):
+        """Format the top functions of a profile"""
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.strip_dirs().sort_stats(sort_key).print_stats(self.TOP_FUNCTIONS)
+        return stream.getvalue()
+
+    # Internal method starts with _
+    def _format_allocations(self, snapshot):
+        """Format the top allocation sites of a tracemalloc snapshot"""
+        lines = []
+        for statistic in snapshot.statistics('lineno')[:self.TOP_ALLOCATIONS]:
+            lines.append(str(statistic))
+        return "\n".join(lines) + "\n"
+
+    def profile_worker_call(self, func, *args):
+        """Call func in an extraction worker, saving its profile and the worker's allocations for the report"""
+        worker_dir = self._get_worker_dir()
+        os.makedirs(worker_dir, exist_ok=True)
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            self._worker_call_count += 1
+            profile.dump_stats(os.path.join(worker_dir, f"{os.getpid()}-{self._worker_call_count}.prof"))
+            tracemalloc.take_snapshot().dump(os.path.join(worker_dir, f"{os.getpid()}.tracemalloc"))
+
+    def profile_thread_call(self, func, *args):
+        """Call func in a thread of the event loop process, saving its profile for the report"""
+        # From Python 3.12 the batch profile already covers all threads, and only one profiler may be active at a time
+        if sys.version_info >= (3, 12):
+            return func(*args)
+
+        thread_dir = self._get_thread_dir()
+        os.makedirs(thread_dir, exist_ok=True)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiling tool is active, profiling must never fail the call itself
+            self._log("Profiler profile_thread_call Error", e)
+            return func(*args)
+
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            with self._thread_call_lock:
+                self._thread_call_count += 1
+                thread_call_count = self._thread_call_count
+            profile.dump_stats(os.path.join(thread_dir, f"{thread_call_count}.prof"))
+
+class _SlowCallbackHandler(logging.Handler):
+    """Collects the slow callback warnings asyncio logs in debug mode"""
+
+    def __init__(self, slow_callbacks):
+        super().__init__(level=logging.WARNING)
+        self.slow_callbacks = slow_callbacks
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith('Executing'):
+            self.slow_callbacks.append(message)
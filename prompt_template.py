@@ -0,0 +1,61 @@
+class PromptTemplate:
+    """Prompt compiled once per settings version, with a byte-identical prefix so provider-side prompt caching applies"""
+
+    # Static rules shared by every request, always sent first and never changed by settings
+    SYSTEM_PREFIX = (
+        "You are an assistant that provides file naming suggestions based on the file content.\n"
+        "When asked to rename a file, you always adhere to the following rules:\n"
+        "1. ONLY output the suggested new file name without any additional text.\n"
+        "2. Do not add any file extension to the new file name\n"
+        "3. Since the content of the parsed files lacks a hierarchical structure, please make sure to come up with a file name that takes all the file content into account.\n"
+        "4. Avoid using any invalid characters in new file name.\n"
+    )
+
+    USER_PROMPT_PREFIX = "Please suggest a new file name (without extension) based on the following file content: "
+
+    USER_IMAGE_PROMPT = "Please suggest a new file name (without extension) based on the content of the following image."
+
+    NOT_APPLICABLE_PROMPT = "This is not applicable, please ignore this requirement temporarily."
+
+    # Naming convention prompts for English naming
+    NAMING_CONVENTION_PROMPTS = {
+        'with-spaces': "Capitalize the first letter of each word and separate words with spaces, e.g. This Is New File Name",
+        'pascal-case': "PascalCase: Capitalize the first letter of each word without spaces in between, e.g. ThisIsNewFileName",
+        'camel-case': "camelCase: Except for the first word being in lowercase, the first letter of each subsequent word is capitalized, with no spaces in between., e.g. thisIsNewFileName",
+        'snake-case': "snake_case: Lowercase each word and separate words with underscores, e.g. this_is_new_file_name",
+        'kebab-case': "kebab-case: Lowercase each word and separate words with hyphens, e.g. this-is-new-file-name",
+        'not-applicable': NOT_APPLICABLE_PROMPT
+    }
+
+    def __init__(self, naming_language, naming_convention, custom_instruction):
+        # Naming convention only applies to English naming
+        if naming_language == 'en':
+            naming_convention_prompt = self.NAMING_CONVENTION_PROMPTS.get(naming_convention, self.NOT_APPLICABLE_PROMPT)
+        else:
+            naming_convention_prompt = self.NOT_APPLICABLE_PROMPT
+
+        # Settings-dependent rules go after the static prefix, they only change with the settings version
+        self.system_prompt = (
+            self.SYSTEM_PREFIX
+            + f"5. Use {naming_language} for naming the file.\n"
+            + f"6. Follow the naming convention: {naming_convention_prompt}\n"
+            + "---\n"
+            + f"Custom Instruction: {(custom_instruction or '').strip()}"
+        )
+
+    def build_messages(self, file_content):
+        """Build chat messages with the stable system prompt first and the file content last"""
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": self.USER_PROMPT_PREFIX + file_content}
+        ]
+
+    def build_image_messages(self, image_url):
+        """Build chat messages asking the vision model for the file name of an image directly"""
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": [
+                {"type": "text", "text": self.USER_IMAGE_PROMPT},
+                {"type": "image_url", "image_url": {"url": image_url}}
+            ]}
+        ]
\ No newline at end of file
@@ -0,0 +1,116 @@
+import asyncio
+import socket
+import os
+
+class QueueWorker:
+    """Headless worker: leases files from a shared work queue, renames them and reports the results"""
+
+    def __init__(self, settings, file_processor, work_queue, worker_id=None):
+        self.settings = settings
+        self.file_processor = file_processor
+        self.work_queue = work_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+        self._leased = {} # Item id -> file path of files being renamed by this worker
+        self._tasks = {} # Item id -> task renaming the file, cancelled when its lease is lost
+
+    # Internal method starts with _
+    def _log(self, title, message):
+        """Utility method for debugging purposes"""
+        print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
+
+    async def run(self):
+        """Rename files from the queue until it has no pending or leased files left, returns (success, message)"""
+        concurrency = self.settings.get('queue_worker_concurrency')
+        lease_seconds = self.settings.get('queue_lease_seconds')
+        poll_interval = self.settings.get('queue_poll_interval')
+
+        tasks = set()
+        processed_count = 0
+        renewer = asyncio.create_task(self._renew_leases(lease_seconds))
+        self.file_processor.begin_batch()
+
+        try:
+            while True:
+                # Keep the worker's slots full, leasing only as many files as there are free slots
+                free_slots = concurrency - len(tasks)
+                if free_slots > 0:
+                    try:
+                        items = await asyncio.to_thread(self.work_queue.lease, self.worker_id, free_slots, lease_seconds)
+                    except Exception as e:
+                        # The queue may be briefly unreachable (e.g. network share), the next round retries
+                        self._log("QueueWorker run Error", e)
+                        items = []
+
+                    for item_id, file_path in items:
+                        self._leased[item_id] = file_path
+                        task = asyncio.create_task(self._process(item_id, file_path))
+                        self._tasks[item_id] = task
+                        tasks.add(task)
+
+                if not tasks:
+                    # Nothing to lease, but files leased by other workers may still come back if a worker crashes
+                    try:
+                        stats = await asyncio.to_thread(self.work_queue.stats)
+                    except Exception as e:
+                        self._log("QueueWorker run Error", e)
+                        stats = None
+                    if stats is not None and stats['pending'] == 0 and stats['leased'] == 0:
+                        break
+                    await asyncio.sleep(poll_interval)
+                    continue
+
+                done, tasks = await asyncio.wait(tasks, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                processed_count += sum(1 for task in done if not task.cancelled()) # Cancelled tasks lost their lease
+
+        finally:
+            renewer.cancel()
+            for task in tasks:
+                task.cancel()
+            self.file_processor.end_batch()
+
+        stats = await asyncio.to_thread(self.work_queue.stats)
+        return True, f"Worker {self.worker_id} processed {processed_count} file(s), queue: {stats}"
+
+    # Internal method starts with _
+    async def _process(self, item_id, file_path):
+        """Rename a leased file and report the result to the queue"""
+        try:
+            if not os.path.exists(file_path):
+                success, message = False, "File not found"
+            else:
+                success, message = await self.file_processor.rename_file(file_path)
+        except Exception as e:
+            success, message = False, str(e)
+
+        try:
+            if not await asyncio.to_thread(self.work_queue.complete, self.worker_id, item_id, success, message):
+                # Lease expired and the file went to another worker, whose result counts
+                self._log("QueueWorker _process Warning", f"Lease lost for {file_path}")
+        finally:
+            self._leased.pop(item_id, None)
+            self._tasks.pop(item_id, None)
+
+        self._log("QueueWorker Result", f"{file_path}: {'Renamed to ' if success else 'Failed: '}{message}")
+
+    # Internal method starts with _
+    async def _renew_leases(self, lease_seconds):
+        """Extend the leases of files still being renamed, well before they expire"""
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            if not self._leased:
+                continue
+
+            try:
+                lost_item_ids = await asyncio.to_thread(self.work_queue.renew, self.worker_id, list(self._leased), lease_seconds)
+            except Exception as e:
+                # The queue may be briefly unreachable (e.g. network share), the next renewal retries
+                self._log("QueueWorker _renew_leases Error", e)
+                continue
+
+            # The file went to another worker, stop renaming it here so it is not renamed twice
+            for item_id in lost_item_ids:
+                self._log("QueueWorker _renew_leases Warning", f"Lease lost for {self._leased.pop(item_id, None)}, cancelling")
+                task = self._tasks.pop(item_id, None)
+                if task is not None:
+                    task.cancel()
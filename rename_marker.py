@@ -0,0 +1,161 @@
+import threading
+import hashlib
+import errno
+import json
+import os
+
+class RenameMarker:
+    """Marks renamed files, so re-runs skip them with a single stat and getxattr
+
+    The marker is a user.renami extended attribute holding the file's size, mtime, a hash of its size, start and end, and the fingerprint of
+    the naming settings. Where extended attributes are unavailable (e.g. Windows, macOS, some network shares), markers
+    are kept in a sidecar index file per directory instead.
+    """
+
+    XATTR_NAME = 'user.renami'
+    SIDECAR_NAME = '.renami_index.json'
+    VERSION = 2
+
+    # Bytes hashed from the start and from the end of a file, so checking a large file reads at most twice this
+    HASH_SAMPLE_BYTES = 64 * 1024
+
+    # Settings that change the suggested name, a marker only applies while they stay the same
+    FINGERPRINT_KEYS = ('llm_provider', 'naming_language', 'naming_convention', 'custom_instruction', 'metadata_naming', 'vision_naming', 'model_routes')
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._fingerprint = None
+        self._fingerprint_version = None
+        self._sidecars = {} # Directory -> {file name: marker}, loaded on first use
+        self._dirty_directories = set() # Directories whose sidecar index has unsaved markers
+        self._lock = threading.Lock() # Markers are written from worker threads
+
+    # Internal method starts with _
+    def _log(self, title, message):
+        """Utility method for debugging purposes"""
+        print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
+
+    def settings_fingerprint(self):
+        """Return a short hash of the settings that affect the suggested name, computed once per settings version"""
+        settings_version = self.settings.version()
+
+        if self._fingerprint is None or self._fingerprint_version != settings_version:
+            llm_provider = self.settings.get('llm_provider')
+            values = [self.settings.get(key) for key in self.FINGERPRINT_KEYS] + [self.settings.get(f'{llm_provider}_model')]
+            self._fingerprint = hashlib.blake2b(json.dumps(values).encode('utf-8'), digest_size=8).hexdigest()
+            self._fingerprint_version = settings_version
+
+        return self._fingerprint
+
+    def is_processed(self, file_path):
+        """Whether the file was renamed before with the current settings and has not changed since"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+
+        marker = self._read_marker(file_path)
+        if marker is None or marker.get('version') != self.VERSION:
+            return False
+
+        if marker.get('settings') != self.settings_fingerprint() or marker.get('size') != stat.st_size:
+            return False
+
+        if marker.get('mtime_ns') == stat.st_mtime_ns:
+            return True
+
+        # Same size but touched (e.g. copied without preserving times), compare the sampled content before renaming it again
+        try:
+            if self._hash_file(file_path) != marker.get('hash'):
+                return False
+        except OSError:
+            return False
+
+        self.mark(file_path)
+        return True
+
+    def mark(self, file_path):
+        """Write the marker of a renamed file"""
+        try:
+            stat = os.stat(file_path)
+            marker = {
+                'version': self.VERSION,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'hash': self._hash_file(file_path),
+                'settings': self.settings_fingerprint()
+            }
+        except OSError as e:
+            self._log("RenameMarker mark Error", e)
+            return
+
+        # Extended attributes travel with the file and do not change its mtime
+        if hasattr(os, 'setxattr'):
+            try:
+                os.setxattr(file_path, self.XATTR_NAME, json.dumps(marker).encode('utf-8'))
+                return
+            except OSError as e:
+                if e.errno not in (errno.ENOTSUP, errno.EOPNOTSUPP, errno.EPERM, errno.EACCES):
+                    self._log("RenameMarker mark Error", e)
+                    return
+
+        directory, file_name = os.path.split(os.path.abspath(file_path))
+        with self._lock:
+            self._get_sidecar(directory)[file_name] = marker
+            self._dirty_directories.add(directory)
+
+    def flush(self):
+        """Save the sidecar indexes that have new markers"""
+        with self._lock:
+            dirty_directories, self._dirty_directories = self._dirty_directories, set()
+            sidecars = {directory: dict(self._sidecars[directory]) for directory in dirty_directories}
+
+        for directory, sidecar in sidecars.items():
+            sidecar_path = os.path.join(directory, self.SIDECAR_NAME)
+            temp_path = sidecar_path + '.tmp'
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(sidecar, f, ensure_ascii=False)
+                os.replace(temp_path, sidecar_path)
+            except OSError as e:
+                self._log("RenameMarker flush Error", e)
+
+    # Internal method starts with _
+    def _read_marker(self, file_path):
+        """Return the marker from the extended attribute or the sidecar index, None if the file has none"""
+        if hasattr(os, 'getxattr'):
+            try:
+                return json.loads(os.getxattr(file_path, self.XATTR_NAME))
+            except (OSError, ValueError):
+                pass
+
+        directory, file_name = os.path.split(os.path.abspath(file_path))
+        with self._lock:
+            return self._get_sidecar(directory).get(file_name)
+
+    # Internal method starts with _
+    def _get_sidecar(self, directory):
+        """Return the sidecar index of a directory, loading it on first use (call with the lock held)"""
+        sidecar = self._sidecars.get(directory)
+        if sidecar is None:
+            sidecar = {}
+            try:
+                with open(os.path.join(directory, self.SIDECAR_NAME), 'r', encoding='utf-8') as f:
+                    sidecar = json.load(f)
+            except (OSError, ValueError):
+                pass
+            self._sidecars[directory] = sidecar
+        return sidecar
+
+    # Internal method starts with _
+    def _hash_file(self, file_path):
+        """Return the hash of a file's size, start and end, small files are hashed whole"""
+        file_hash = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            file_hash.update(str(size).encode('ascii'))
+            file_hash.update(f.read(self.HASH_SAMPLE_BYTES))
+            if size > self.HASH_SAMPLE_BYTES:
+                f.seek(max(self.HASH_SAMPLE_BYTES, size - self.HASH_SAMPLE_BYTES))
+                file_hash.update(f.read(self.HASH_SAMPLE_BYTES))
+        return file_hash.hexdigest()
@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+import asyncio
+import time
+import os
+from settings import Settings
+from ai_service import AIService
+from file_processor import FileProcessor
+
+@dataclass(frozen=True, slots=True)
+class RenameResult:
+    """Outcome of renaming a single file"""
+    file_path: str # Original file path
+    success: bool
+    message: str # New file name, or the error message
+    new_file_path: str | None = None # Current path of the renamed file, None on failure and in a dry run
+    skipped: bool = False # Already renamed by an earlier run with the same settings
+    dry_run: bool = False # New name only suggested, the file was left as is
+    elapsed: float = 0.0 # Seconds spent on the file
+
+class RenamiEngine:
+    """UI-free API for renaming files in-process, results are yielded as each file finishes
+
+        engine = RenamiEngine()
+        async for result in engine.rename(paths, concurrency=8, dry_run=True):
+            print(result.file_path, result.message)
+
+    Paths are consumed lazily and at most concurrency files are in flight, so arbitrarily many paths can be streamed.
+    One rename run at a time per engine, files of a run share one batch (near-duplicate clustering, memory budget).
+    """
+
+    def __init__(self, settings=None, ai_service=None, file_processor=None):
+        self.settings = settings or Settings()
+        self.ai_service = ai_service or AIService(self.settings)
+        self.file_processor = file_processor or FileProcessor(self.settings, self.ai_service)
+
+    async def rename(self, paths, concurrency=None, dry_run=False, use_cache=True):
+        """Rename files from an iterable or async iterable of paths, yielding a RenameResult as each file finishes
+
+        concurrency defaults to the max_concurrent_files setting. With dry_run, new names are suggested but files are not
+        renamed. Without use_cache, files renamed by an earlier run are processed again.
+        """
+        concurrency = concurrency or self.settings.get('max_concurrent_files')
+        path_iterator = self._iterate(paths)
+        tasks = set()
+        exhausted = False
+
+        self.file_processor.begin_batch()
+        try:
+            while tasks or not exhausted:
+                # Top up the files in flight from the paths
+                while not exhausted and len(tasks) < concurrency:
+                    try:
+                        file_path = await anext(path_iterator)
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    tasks.add(asyncio.create_task(self._rename(os.fspath(file_path), dry_run, use_cache)))
+
+                if not tasks:
+                    break
+
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+
+        finally:
+            # Also runs when the caller stops iterating early
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.file_processor.end_batch()
+
+    def close(self):
+        """Stop the extraction worker processes"""
+        self.file_processor.extraction_pool.shutdown()
+
+    # Internal method starts with _
+    async def _iterate(self, paths):
+        """Iterate over an iterable or async iterable of paths"""
+        if hasattr(paths, '__aiter__'):
+            async for file_path in paths:
+                yield file_path
+        else:
+            for file_path in paths:
+                yield file_path
+
+    # Internal method starts with _
+    async def _rename(self, file_path, dry_run, use_cache):
+        """Rename a single file, never raises so one file cannot stop the run"""
+        start_time = time.perf_counter()
+
+        def result(success, message, **kwargs):
+            return RenameResult(file_path, success, message, elapsed=time.perf_counter() - start_time, **kwargs)
+
+        if not os.path.exists(file_path):
+            return result(False, f"File not found: {file_path}")
+
+        file_extension = os.path.splitext(file_path)[1].lower()
+        if file_extension not in self.file_processor.supported_extensions:
+            return result(False, f"Unsupported file type: {file_extension}")
+
+        llm_provider = self.settings.get('llm_provider')
+        if not self.settings.get(f'{llm_provider}_api_key'):
+            return result(False, "Please set your API key first")
+
+        try:
+            if use_cache and await self.file_processor.is_processed(file_path):
+                return result(True, os.path.basename(file_path), new_file_path=file_path, skipped=True)
+
+            success, message = await self.file_processor.rename_file(file_path, dry_run=dry_run, use_cache=False)
+        except Exception as e:
+            return result(False, str(e))
+
+        if not success:
+            return result(False, message)
+
+        new_file_path = os.path.join(os.path.dirname(file_path), message)
+        return result(True, message, new_file_path=None if dry_run else new_file_path, dry_run=dry_run)
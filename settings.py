@@ -2,8 +2,68 @@ import json
 import os
 import sys
 
+# Default config, used to create config_template.json and as fallback for keys missing from older config files
+DEFAULT_CONFIG = {
+    "llm_provider": "openai",
+    "openai_api_key": "",
+    "openai_api_base_url": "https://api.openai.com/v1",
+    "openai_model": "gpt-4o-mini",
+    "gemini_api_key": "",
+    "gemini_api_base_url": "https://generativelanguage.googleapis.com/v1beta/openai",
+    "gemini_model": "gemini-2.0-flash-lite-preview-02-05",
+    "doubao_api_key": "",
+    "doubao_api_base_url": "https://ark.cn-beijing.volces.com/api/v3/",
+    "doubao_model": "doubao-1-5-vision-pro-32k-250115",
+    "openai_compatible_api_key": "",
+    "openai_compatible_api_base_url": "",
+    "openai_compatible_model": "",
+    "naming_language": "en",
+    "naming_convention": "with-spaces",
+    "custom_instruction": "",
+    "request_timeout": 30,
+    "file_timeout": 120,
+    "hedge_requests": False,
+    "text_read_limit": 32768,
+    "text_tail_sample": 2048,
+    "metadata_naming": True,
+    "metadata_confidence_threshold": 0.8,
+    "near_duplicate_clustering": True,
+    "near_duplicate_max_distance": 6,
+    "near_duplicate_max_clusters": 1000,
+    "max_content_chars": 50000,
+    "max_inflight_content_mb": 64,
+    "extraction_workers": 2,
+    "worker_rss_limit_mb": 1024,
+    "batch_poll_interval": 60,
+    "watch_directories": [],
+    "watch_debounce_seconds": 2,
+    "watch_max_concurrency": 4,
+    "profiling": False,
+    "profile_output_dir": "profiles",
+    "profile_slow_callback_ms": 100,
+    "prompt_price_per_million_tokens": 0.15,
+    "completion_price_per_million_tokens": 0.6,
+    "budget_cap_usd": 0,
+    "warm_up_on_startup": True,
+    "vision_naming": True,
+    "vision_max_image_side": 1024,
+    "llm_max_concurrency": 8,
+    "queue_worker_concurrency": 4,
+    "queue_lease_seconds": 300,
+    "queue_max_attempts": 3,
+    "queue_poll_interval": 5,
+    "skip_processed_files": True,
+    "model_routes": [],
+    "normalize_content": True,
+    "max_concurrent_files": 16
+}
+
 class Settings:
     def __init__(self):
+        # Parsed config cache, invalidated when the config file changes
+        self._cache = None
+        self._cache_version = None
+
         try:
             # If the application is run as a bundle
             if getattr(sys, 'frozen', False):
@@ -19,26 +79,8 @@ class Settings:
                     # Create default config_template.json if neither exists
                     self.config_file = config_template_path
 
-                    config_template = {
-                        "llm_provider": "openai",
-                        "openai_api_key": "",
-                        "openai_api_base_url": "https://api.openai.com/v1",
-                        "openai_model": "gpt-4o-mini",
-                        "gemini_api_key": "",
-                        "gemini_api_base_url": "https://generativelanguage.googleapis.com/v1beta/openai",
-                        "gemini_model": "gemini-2.0-flash-lite-preview-02-05",
-                        "doubao_api_key": "",
-                        "doubao_api_base_url": "https://ark.cn-beijing.volces.com/api/v3/",
-                        "doubao_model": "doubao-1-5-vision-pro-32k-250115",
-                        "openai_compatible_api_key": "",
-                        "openai_compatible_api_base_url": "",
-                        "openai_compatible_model": "",
-                        "naming_language": "en",
-                        "naming_convention": "with-spaces",
-                        "custom_instruction": ""
-                    }
                     with open(self.config_file, 'w') as f:
-                        json.dump(config_template, f, indent=4)
+                        json.dump(DEFAULT_CONFIG, f, indent=4)
             
             # If the application is run as a script
             else:
@@ -51,8 +93,17 @@ class Settings:
             print(f"Error initializing settings: {e}")
             return {}
     
+    def version(self):
+        """Return a version stamp of the config file that changes whenever the file is modified"""
+        stat = os.stat(self.config_file)
+        return (stat.st_mtime_ns, stat.st_size)
+
     def load(self):
-        """Load settings from config file"""
+        """Load settings from config file, reusing the parsed config until the file changes"""
+        version = self.version()
+        if self._cache is not None and self._cache_version == version:
+            return dict(self._cache)
+
         with open(self.config_file, 'r') as f:
             settings = json.load(f)
             
@@ -78,17 +129,20 @@ class Settings:
 
                 if llm_provider == 'openai_compatible':
                     api_base_url = api_base_url.rstrip('/')
-                
-            return settings
+
+            self._cache = settings
+            self._cache_version = version
+            return dict(settings)
         
     def save(self, settings):
         """Save settings to config file"""
         with open(self.config_file, 'w') as f:
             json.dump(settings, f, indent=4)
+        self._cache = None
 
     def get(self, key, default=None):
-        """Get a setting value"""
-        return self.load().get(key, default)
+        """Get a setting value, falling back to the default config for missing keys"""
+        return self.load().get(key, DEFAULT_CONFIG.get(key, default))
     
     def update(self, new_settings):
         """Update settings with new values"""
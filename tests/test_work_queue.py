@@ -0,0 +1,101 @@
+import tempfile
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from work_queue import WorkQueue, SQLiteWorkQueue, open_work_queue
+
+# Lease duration that has already run out when the next call is made, stands in for a crashed worker
+EXPIRED = -1
+
+class SQLiteWorkQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.work_queue = SQLiteWorkQueue(os.path.join(self.temp_dir.name, 'queue.db'), max_attempts=2)
+
+    def tearDown(self):
+        self.work_queue.close()
+        self.temp_dir.cleanup()
+
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            WorkQueue()
+
+    def test_enqueue_ignores_queued_files(self):
+        self.assertEqual(self.work_queue.enqueue(['a.pdf', 'b.pdf']), 2)
+        self.assertEqual(self.work_queue.enqueue(['a.pdf', 'c.pdf']), 1)
+        self.assertEqual(self.work_queue.stats()['pending'], 3)
+
+    def test_lease_hands_out_each_file_once(self):
+        self.work_queue.enqueue(['a.pdf', 'b.pdf', 'c.pdf'])
+
+        first = self.work_queue.lease('worker-1', 2, 60)
+        second = self.work_queue.lease('worker-2', 2, 60)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({item_id for item_id, _ in first} & {item_id for item_id, _ in second})
+        self.assertEqual(self.work_queue.stats()['leased'], 3)
+
+    def test_expired_lease_is_reclaimed(self):
+        self.work_queue.enqueue(['a.pdf'])
+        [(item_id, file_path)] = self.work_queue.lease('worker-1', 1, EXPIRED)
+
+        self.assertEqual(self.work_queue.lease('worker-2', 1, 60), [(item_id, file_path)])
+
+        # The first worker lost the lease, renewing reports it as lost
+        self.assertEqual(self.work_queue.renew('worker-1', [item_id], 60), [item_id])
+        self.assertEqual(self.work_queue.renew('worker-2', [item_id], 60), [])
+
+    def test_live_lease_is_not_reclaimed(self):
+        self.work_queue.enqueue(['a.pdf'])
+        self.work_queue.lease('worker-1', 1, 60)
+
+        self.assertEqual(self.work_queue.lease('worker-2', 1, 60), [])
+
+    def test_file_fails_after_max_attempts(self):
+        self.work_queue.enqueue(['a.pdf'])
+        self.work_queue.lease('worker-1', 1, EXPIRED)
+        self.work_queue.lease('worker-2', 1, EXPIRED)
+
+        # Both attempts expired, the file is given up instead of being leased a third time
+        self.assertEqual(self.work_queue.lease('worker-3', 1, 60), [])
+        self.assertEqual(self.work_queue.stats(), {'pending': 0, 'leased': 0, 'done': 0, 'failed': 1})
+
+    def test_complete_records_the_result(self):
+        self.work_queue.enqueue(['a.pdf', 'b.pdf'])
+        [(first_id, _), (second_id, _)] = self.work_queue.lease('worker-1', 2, 60)
+
+        self.assertTrue(self.work_queue.complete('worker-1', first_id, True, 'Invoice.pdf'))
+        self.assertTrue(self.work_queue.complete('worker-1', second_id, False, 'Extraction failed'))
+        self.assertEqual(self.work_queue.stats(), {'pending': 0, 'leased': 0, 'done': 1, 'failed': 1})
+
+    def test_stale_completion_is_rejected(self):
+        self.work_queue.enqueue(['a.pdf'])
+        [(item_id, _)] = self.work_queue.lease('worker-1', 1, EXPIRED)
+        self.work_queue.lease('worker-2', 1, 60)
+
+        # The first worker finishes after its lease was handed to the second, only the second's result counts
+        self.assertFalse(self.work_queue.complete('worker-1', item_id, False, 'Too late'))
+        self.assertEqual(self.work_queue.stats()['leased'], 1)
+
+        self.assertTrue(self.work_queue.complete('worker-2', item_id, True, 'Invoice.pdf'))
+        self.assertFalse(self.work_queue.complete('worker-2', item_id, True, 'Invoice.pdf'))
+        self.assertEqual(self.work_queue.stats()['done'], 1)
+
+class OpenWorkQueueTest(unittest.TestCase):
+    def test_plain_path_and_url_open_sqlite(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for location in (os.path.join(temp_dir, 'plain.db'), 'sqlite://' + os.path.join(temp_dir, 'url.db')):
+                work_queue = open_work_queue(location)
+                self.assertIsInstance(work_queue, SQLiteWorkQueue)
+                work_queue.close()
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            open_work_queue('redis://localhost/0')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,267 @@
+import codecs
+import csv
+import io
+import json
+import mmap
+import os
+import re
+
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
+class TextReader:
+    """Fast-path reader for text formats, reads a bounded prefix (and optional tail) through mmap instead of MarkItDown"""
+
+    supported_extensions = ('.txt', '.md', '.json', '.csv', '.xml', '.html')
+
+    # Byte order marks, longest first since the UTF-32 LE BOM starts with the UTF-16 LE BOM
+    BOMS = (
+        (codecs.BOM_UTF32_LE, 'utf-32'),
+        (codecs.BOM_UTF32_BE, 'utf-32'),
+        (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF16_LE, 'utf-16'),
+        (codecs.BOM_UTF16_BE, 'utf-16'),
+    )
+
+    # Tail decoding per BOM encoding: the tail has no BOM, so the byte order and code unit size must be explicit
+    TAIL_ENCODINGS = {
+        codecs.BOM_UTF32_LE: ('utf-32-le', 4),
+        codecs.BOM_UTF32_BE: ('utf-32-be', 4),
+        codecs.BOM_UTF16_LE: ('utf-16-le', 2),
+        codecs.BOM_UTF16_BE: ('utf-16-be', 2),
+    }
+
+    # Bytes of the sample used for charset detection, enough to tell encodings apart
+    DETECTION_SAMPLE_BYTES = 64 * 1024
+
+    # Without charset_normalizer: GB18030 also decodes most cp1252 byte pairs, but as CJK characters stuck inside Latin
+    # words ("ventes 閘ev閑s"), so it is only accepted when few CJK characters touch an ASCII letter
+    CJK_PATTERN = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+    CJK_IN_WORD_PATTERN = re.compile(r'(?<=[A-Za-z])[\u4e00-\u9fff]|[\u4e00-\u9fff](?=[A-Za-z])')
+    MAX_CJK_IN_WORD_RATIO = 0.5
+
+    # Legacy encodings tried in order without charset_normalizer, latin-1 never fails so it is the last resort
+    FALLBACK_ENCODINGS = ('cp1252', 'latin-1')
+
+    CSV_SAMPLE_ROWS = 20
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    # Internal method starts with _
+    def _log(self, title, message):
+        """Utility method for debugging purposes"""
+        print(f"\n\n\n-----------------\n\n\n# {title}:\n\n{message}")
+
+    def read(self, file_path):
+        """Read a bounded sample of a text file, returns (success, content) like FileProcessor.extract_content"""
+        file_extension = os.path.splitext(file_path)[1].lower()
+
+        try:
+            prefix, tail, tail_offset, truncated = self._read_sample(file_path)
+        except OSError as e:
+            self._log("TextReader read Error", e)
+            return False, f"Error extracting file content: {str(e)}"
+
+        if not prefix.strip():
+            return True, "Blank file"
+
+        # Decode the sample with a cheaply detected encoding
+        encoding = self._detect_encoding(prefix)
+        text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(prefix, final=not truncated)
+
+        if file_extension == '.csv':
+            content = self._summarize_csv(text, truncated)
+        elif file_extension == '.json':
+            content = self._summarize_json(text, truncated)
+        elif file_extension == '.html':
+            content = self._summarize_html(text)
+        else:
+            content = text
+
+        # Append the tail sample to plain text, it often holds totals, signatures or the latest log entries
+        if tail and file_extension not in ('.csv', '.json'):
+            content += "\n...\n" + self._decode_tail(prefix, encoding, tail, tail_offset)
+
+        self._log("TextReader read Result", f"{file_path} ({encoding}, truncated: {truncated}):\n\n{content}")
+        return True, content
+
+    # Internal method starts with _
+    def _read_sample(self, file_path):
+        """Memory-map the file and return (prefix, tail, truncated) without loading the whole file"""
+        read_limit = self.settings.get('text_read_limit')
+        tail_sample = self.settings.get('text_tail_sample')
+
+        with open(file_path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+
+            # Empty files cannot be memory-mapped
+            if file_size == 0:
+                return b'', b'', 0, False
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                prefix = mm[:read_limit]
+                tail = b''
+                tail_offset = max(read_limit, file_size - tail_sample)
+                if tail_sample and file_size > read_limit:
+                    tail = mm[tail_offset:]
+
+        return prefix, tail, tail_offset, file_size > read_limit
+
+    # Internal method starts with _
+    def _decode_tail(self, prefix, encoding, tail, tail_offset):
+        """Decode the tail sample, which starts at an arbitrary byte offset and has no BOM"""
+        for bom, (tail_encoding, unit_size) in self.TAIL_ENCODINGS.items():
+            if prefix.startswith(bom):
+                # Start at the next code unit boundary, counted from the start of the file
+                tail = tail[-tail_offset % unit_size:]
+                return tail.decode(tail_encoding, errors='ignore')
+
+        # Byte-oriented encodings resynchronize by themselves, a cut-off character is ignored
+        return tail.decode('utf-8' if encoding == 'utf-8-sig' else encoding, errors='ignore')
+
+    # Internal method starts with _
+    def _detect_encoding(self, sample):
+        """Detect the encoding from the BOM, UTF-8, charset detection over the sample or the fallback encodings"""
+        for bom, encoding in self.BOMS:
+            if sample.startswith(bom):
+                return encoding
+
+        sample = sample[:self.DETECTION_SAMPLE_BYTES]
+        if self._decodes(sample, 'utf-8'):
+            return 'utf-8'
+
+        # Same detection MarkItDown uses, bounded to the sample
+        if charset_normalizer is not None:
+            match = charset_normalizer.from_bytes(sample).best()
+            if match is not None:
+                return match.encoding
+
+        elif self._decodes(sample, 'gb18030'):
+            text = codecs.getincrementaldecoder('gb18030')(errors='replace').decode(sample, final=False)
+            cjk_count = len(self.CJK_PATTERN.findall(text))
+            if cjk_count and len(self.CJK_IN_WORD_PATTERN.findall(text)) / cjk_count < self.MAX_CJK_IN_WORD_RATIO:
+                return 'gb18030'
+
+        for encoding in self.FALLBACK_ENCODINGS:
+            if self._decodes(sample, encoding):
+                return encoding
+
+        return 'latin-1'
+
+    # Internal method starts with _
+    def _decodes(self, sample, encoding):
+        """Whether the sample decodes without errors"""
+        try:
+            # Incremental decoding tolerates a multi-byte character cut off at the end of the sample
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return True
+        except UnicodeDecodeError:
+            return False
+
+    # Internal method starts with _
+    def _summarize_csv(self, text, truncated):
+        """Keep only the header and a few sample rows of a CSV file"""
+        lines = text.splitlines()
+
+        # Drop the last line if it was cut off by the read limit
+        if truncated and len(lines) > 1:
+            lines = lines[:-1]
+
+        sample = "\n".join(lines[:self.CSV_SAMPLE_ROWS + 1])
+        try:
+            dialect = csv.Sniffer().sniff(sample)
+        except csv.Error:
+            dialect = csv.excel
+
+        rows = list(csv.reader(io.StringIO(sample), dialect))
+        if not rows:
+            return text
+
+        summary = "Columns: " + ", ".join(rows[0])
+        if len(rows) > 1:
+            summary += "\nSample rows:\n" + "\n".join(", ".join(row) for row in rows[1:])
+        return summary
+
+    # Internal method starts with _
+    def _summarize_json(self, text, truncated):
+        """Keep only the top-level keys (and short scalar values) of a JSON file"""
+        if not truncated:
+            try:
+                data = json.loads(text)
+            except ValueError:
+                return text
+
+            if isinstance(data, dict):
+                lines = []
+                for key, value in data.items():
+                    if isinstance(value, (str, int, float, bool)):
+                        lines.append(f"{key}: {str(value)[:200]}")
+                    else:
+                        lines.append(key)
+                return "Top-level keys:\n" + "\n".join(lines)
+
+            if isinstance(data, list):
+                summary = f"Array of {len(data)} items"
+                if data and isinstance(data[0], dict):
+                    summary += "\nItem keys: " + ", ".join(data[0].keys())
+                return summary
+
+            return text
+
+        # The prefix is not valid JSON on its own, scan it for top-level keys instead
+        if not text.lstrip().startswith('{'):
+            return text
+
+        keys = self._scan_top_level_keys(text)
+        if not keys:
+            return text
+        return "Top-level keys:\n" + "\n".join(keys)
+
+    # Internal method starts with _
+    def _scan_top_level_keys(self, text):
+        """Scan a possibly truncated JSON object for its top-level keys"""
+        keys = []
+        depth = 0
+        position = 0
+        length = len(text)
+
+        while position < length:
+            char = text[position]
+
+            if char == '"':
+                # Find the end of the string, skipping escaped characters
+                end = position + 1
+                while end < length and text[end] != '"':
+                    end += 2 if text[end] == '\\' else 1
+
+                # A string directly inside the top-level object followed by a colon is a key
+                if depth == 1 and text[end + 1:end + 32].lstrip().startswith(':'):
+                    keys.append(text[position + 1:end])
+
+                position = end + 1
+                continue
+
+            if char in '{[':
+                depth += 1
+            elif char in '}]':
+                depth -= 1
+            position += 1
+
+        return keys
+
+    # Internal method starts with _
+    def _summarize_html(self, text):
+        """Keep the title and the visible text of an HTML file"""
+        title_match = re.search(r'<title[^>]*>(.*?)</title>', text, re.IGNORECASE | re.DOTALL)
+
+        # Drop scripts, styles and tags, then collapse whitespace
+        body = re.sub(r'<(script|style)[^>]*>.*?(</\1>|$)', ' ', text, flags=re.IGNORECASE | re.DOTALL)
+        body = re.sub(r'<[^>]+>', ' ', body)
+        body = re.sub(r'\s+', ' ', body).strip()
+
+        if title_match:
+            return f"Title: {title_match.group(1).strip()}\n{body}"
+        return body
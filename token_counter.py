@@ -0,0 +1,34 @@
+import re
+
+# tiktoken is optional, a character-based estimate is used without it
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+class TokenCounter:
+    """Local prompt token estimate, exact with tiktoken and approximate without it"""
+
+    # CJK characters are roughly one token each, other text roughly four characters per token
+    CJK_PATTERN = re.compile(r'[一-鿿]')
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding('o200k_base')
+            except Exception:
+                # Encoding files could not be loaded (e.g. offline), fall back to the estimate
+                self._encoding = None
+
+    def count(self, text):
+        """Return the (estimated) number of tokens in the text"""
+        if not text:
+            return 0
+
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+
+        cjk_count = len(self.CJK_PATTERN.findall(text))
+        return cjk_count + (len(text) - cjk_count + self.CHARS_PER_TOKEN - 1) // self.CHARS_PER_TOKEN
@@ -0,0 +1,168 @@
+from abc import ABC, abstractmethod
+import threading
+import sqlite3
+import time
+import os
+
+class WorkQueue(ABC):
+    """Shared queue of files to rename, workers lease files and report results, expired leases are handed out again
+
+    Backends implement the abstract methods below and register themselves in WORK_QUEUE_BACKENDS under a URL scheme.
+    """
+
+    @abstractmethod
+    def enqueue(self, file_paths):
+        """Add files to the queue, files already queued are left as they are, returns the number added"""
+
+    @abstractmethod
+    def lease(self, worker_id, count, lease_seconds):
+        """Lease up to count files for lease_seconds, returns a list of (item_id, file_path)"""
+
+    @abstractmethod
+    def renew(self, worker_id, item_ids, lease_seconds):
+        """Extend the leases the worker still holds, returns the ids of the leases that were lost"""
+
+    @abstractmethod
+    def complete(self, worker_id, item_id, success, message):
+        """Report the result of a leased file, returns False if the lease was lost meanwhile"""
+
+    @abstractmethod
+    def stats(self):
+        """Return the number of files per status: pending, leased, done and failed"""
+
+    def close(self):
+        """Release the backend's resources"""
+
+class SQLiteWorkQueue(WorkQueue):
+    """Work queue in a SQLite database, which can live on a network share all workers can reach"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY,
+            file_path TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker_id TEXT,
+            lease_expires REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            updated_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS items_status ON items (status, lease_expires);
+    """
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock() # Calls come from worker threads, one connection is shared between them
+
+        # Isolation level None, transactions are started explicitly. The default rollback journal is used,
+        # WAL needs shared memory and does not work on network file systems
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.executescript(self.SCHEMA)
+
+    # Internal method starts with _
+    def _transaction(self, statements):
+        """Run statements(cursor) in a write transaction, taking the database lock up front to avoid deadlocks"""
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(cursor)
+                cursor.execute("COMMIT")
+                return result
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, file_paths):
+        def statements(cursor):
+            now = time.time()
+            cursor.executemany(
+                "INSERT OR IGNORE INTO items (file_path, updated_at) VALUES (?, ?)",
+                ((os.path.abspath(file_path), now) for file_path in file_paths)
+            )
+            return cursor.rowcount
+
+        return self._transaction(statements)
+
+    def lease(self, worker_id, count, lease_seconds):
+        def statements(cursor):
+            now = time.time()
+
+            # Leases of crashed workers expired, give up on files that already used all their attempts
+            cursor.execute(
+                "UPDATE items SET status = 'failed', worker_id = NULL, message = 'Lease expired too many times', updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+
+            rows = cursor.execute(
+                "SELECT id, file_path FROM items "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT ?",
+                (now, count)
+            ).fetchall()
+
+            cursor.executemany(
+                "UPDATE items SET status = 'leased', worker_id = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                ((worker_id, now + lease_seconds, now, item_id) for item_id, _ in rows)
+            )
+            return rows
+
+        return self._transaction(statements)
+
+    def renew(self, worker_id, item_ids, lease_seconds):
+        def statements(cursor):
+            now = time.time()
+            lost_item_ids = []
+            for item_id in item_ids:
+                cursor.execute(
+                    "UPDATE items SET lease_expires = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                    (now + lease_seconds, now, item_id, worker_id)
+                )
+                if cursor.rowcount == 0:
+                    lost_item_ids.append(item_id)
+            return lost_item_ids
+
+        return self._transaction(statements)
+
+    def complete(self, worker_id, item_id, success, message):
+        def statements(cursor):
+            cursor.execute(
+                "UPDATE items SET status = ?, worker_id = NULL, lease_expires = NULL, message = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                ('done' if success else 'failed', message, time.time(), item_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(statements)
+
+    def stats(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall()
+
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        counts.update(rows)
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+# URL scheme -> work queue backend, e.g. a Redis backend would register 'redis'
+WORK_QUEUE_BACKENDS = {
+    'sqlite': SQLiteWorkQueue,
+}
+
+def open_work_queue(location, max_attempts=3):
+    """Open a work queue from a URL like sqlite:///path/to/queue.db, a plain path opens a SQLite queue"""
+    scheme, separator, path = location.partition('://')
+    if not separator:
+        scheme, path = 'sqlite', location
+
+    backend = WORK_QUEUE_BACKENDS.get(scheme)
+    if backend is None:
+        raise ValueError(f"Unknown work queue backend: {scheme}")
+
+    # sqlite:///absolute/path keeps its leading slash, sqlite://relative/path is relative
+    return backend(path, max_attempts=max_attempts)